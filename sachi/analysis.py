@@ -0,0 +1,152 @@
+import asyncio
+import heapq
+import itertools
+from enum import IntEnum
+from functools import cache
+from typing import TYPE_CHECKING, Any, Iterable
+
+from sachi.config import get_config
+from sachi.media import MediaTracks, extract_media, get_media_cache
+from sachi.pool import ExecutorKind, WorkerPool
+
+if TYPE_CHECKING:
+    from sachi.models import SachiFile
+
+
+class Priority(IntEnum):
+    VISIBLE = 0
+    MATCHED = 1
+    PREFETCH = 2
+
+
+class MediaAnalyzer:
+    def __init__(self, workers: int = 4, executor: ExecutorKind = "thread"):
+        self.pool = WorkerPool(workers, executor, "sachi-media")
+
+        # heap entries are [priority, seq, file]; superseded entries get file=None
+        self._heap: list[list] = []
+        self._entries: dict[int, list] = {}
+        self._futures: dict[int, asyncio.Future[None]] = {}
+        self._visible: list["SachiFile"] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def pending(self) -> int:
+        return len(self._entries)
+
+    def submit(
+        self, file: "SachiFile", priority: Priority = Priority.PREFETCH
+    ) -> asyncio.Future[None]:
+        fut = self._futures.get(id(file))
+        if fut is None:
+            fut = asyncio.get_running_loop().create_future()
+            if file.media_analysis_done.is_set():
+                fut.set_result(None)
+                return fut
+            fut.add_done_callback(consume_exception)
+            self._futures[id(file)] = fut
+        elif id(file) not in self._entries:
+            # a worker is already analyzing it
+            return fut
+
+        entry = self._entries.get(id(file))
+        if entry is None or priority < entry[0]:
+            self._push(file, priority)
+        return fut
+
+    async def analyze(self, file: "SachiFile", priority: Priority = Priority.MATCHED):
+        await asyncio.shield(self.submit(file, priority))
+
+    def set_visible(self, files: Iterable["SachiFile"]):
+        visible = list(files)
+        visible_ids = {id(f) for f in visible}
+        for file in self._visible:
+            entry = self._entries.get(id(file))
+            if id(file) not in visible_ids and entry and entry[0] == Priority.VISIBLE:
+                self._push(file, Priority.PREFETCH)
+        self._visible = visible
+        for file in visible:
+            self.submit(file, Priority.VISIBLE)
+
+    def discard(self, file: "SachiFile"):
+        entry = self._entries.pop(id(file), None)
+        if entry is not None:
+            entry[-1] = None
+        fut = self._futures.pop(id(file), None)
+        if fut is not None and not fut.done():
+            fut.cancel()
+
+    def warm_up(self):
+        self.pool.warm_up()
+
+    def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        self.pool.shutdown()
+
+    def _push(self, file: "SachiFile", priority: Priority):
+        old = self._entries.get(id(file))
+        if old is not None:
+            old[-1] = None
+        entry = [priority, next(self._seq), file]
+        self._entries[id(file)] = entry
+        heapq.heappush(self._heap, entry)
+        self._start()
+        self._wakeup.set()
+
+    def _start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker()) for _ in range(self.pool.workers)
+            ]
+
+    async def _worker(self):
+        while True:
+            while not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            *_, file = heapq.heappop(self._heap)
+            if file is None:
+                continue
+            del self._entries[id(file)]
+            fut = self._futures[id(file)]
+            try:
+                tracks = await self._analyze(file)
+                file.apply_media(tracks)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+                file.media_analysis_failed(e)
+            else:
+                if not fut.done():
+                    fut.set_result(None)
+            finally:
+                if self._futures.get(id(file)) is fut:
+                    del self._futures[id(file)]
+
+    async def _analyze(self, file: "SachiFile") -> MediaTracks:
+        media_cache = get_media_cache()
+        key, tracks = await asyncio.to_thread(media_cache.lookup, file.path)
+        if tracks is None:
+            loop = asyncio.get_running_loop()
+            tracks = await loop.run_in_executor(
+                self.pool.executor, extract_media, file.path
+            )
+            await asyncio.to_thread(media_cache.put, key, file.path, tracks)
+        return tracks
+
+
+def consume_exception(fut: asyncio.Future[Any]):
+    if not fut.cancelled():
+        fut.exception()
+
+
+@cache
+def get_media_analyzer() -> MediaAnalyzer:
+    conf = get_config().analysis
+    return MediaAnalyzer(conf.workers, conf.executor)
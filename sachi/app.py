@@ -2,9 +2,15 @@ from pathlib import Path
 
 from textual.app import App
 
-from sachi.config import BaseConfig, read_config
+from sachi.analysis import get_media_analyzer
+from sachi.checksum import get_checksummer
+from sachi.config import CHECK_INTERVAL, ConfigService, get_config_service
+from sachi.filename import get_filename_analyzer
 from sachi.screens.episodes import EpisodesScreen
 from sachi.screens.rename import RenameScreen
+from sachi.sources.base import get_all_sources
+from sachi.sources.http import get_session_manager
+from sachi.sources.limiter import get_rate_limiters
 
 
 class SachiApp(App):
@@ -19,15 +25,49 @@ class SachiApp(App):
         ("q", "quit", "Quit"),
     ]
 
-    def __init__(self, file_or_dir: Path = Path.cwd(), **kwargs):
+    def __init__(
+        self, file_or_dir: Path = Path.cwd(), verify: bool | None = None, **kwargs
+    ):
         super().__init__(**kwargs)
         self.file_or_dir = file_or_dir
+        self.verify = verify
+        # process pools have to be spawned before Textual redirects stderr
+        get_filename_analyzer().warm_up()
+        get_media_analyzer().warm_up()
+
+    def apply_config(self, service: ConfigService):
+        self.theme = "textual-dark" if service.model.general.dark else "textual-light"
+
+    def check_config(self):
+        service = get_config_service()
+        error = service.error
+        service.check()
+        if service.error is not None and service.error is not error:
+            self.notify(str(service.error), title="Invalid config", severity="error")
+
+    def on_config_change(self, service: ConfigService):
+        self.apply_config(service)
+        self.notify("Configuration reloaded")
 
     def on_mount(self):
-        config = read_config()
-        config_model = BaseConfig(**config.unwrap())
-        self.theme = "textual-dark" if config_model.general.dark else "textual-light"
+        service = get_config_service()
+        self.apply_config(service)
+        self.unsubscribe_config = service.subscribe(self.on_config_change)
+        self.set_interval(CHECK_INTERVAL, self.check_config)
 
-        rename_screen = RenameScreen(self.file_or_dir)
+        rename_screen = RenameScreen(self.file_or_dir, self.verify)
         self.install_screen(rename_screen, name="rename")
         self.push_screen(rename_screen)
+
+    async def on_unmount(self):
+        self.unsubscribe_config()
+        get_filename_analyzer().shutdown()
+        get_media_analyzer().shutdown()
+        get_checksummer().shutdown()
+        session_manager = get_session_manager()
+        self.log(f"HTTP: {session_manager.stats}")
+        for source_cls in get_all_sources():
+            self.log(f"{source_cls.service}: {source_cls.coalesce_stats}")
+        for service, limiter in get_rate_limiters().items():
+            self.log(f"{service}: {limiter.stats}")
+        await session_manager.close()
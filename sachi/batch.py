@@ -0,0 +1,307 @@
+import asyncio
+import errno
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, AsyncGenerator
+
+import rich
+from rich.table import Table
+
+from sachi.analysis import get_media_analyzer
+from sachi.bindings import Provider
+from sachi.checksum import Verification, get_checksummer
+from sachi.config import get_config
+from sachi.filename import get_filename_analyzer
+from sachi.journal import RenameJournal
+from sachi.matcher import EpisodeIndex
+from sachi.models import SachiFile, SachiMatch
+from sachi.pipeline import Pipeline, Stage, StageStats
+from sachi.planner import APPLY_BATCH, PlanRecord, plan_renames, write_plan_record
+from sachi.renamer import RenameExecutor, RenameOp
+from sachi.resolver import MIN_CONFIDENCE, get_title_cache
+from sachi.scanner import iter_batches
+from sachi.sources.base import (
+    MediaType,
+    SachiParentModel,
+    SachiSource,
+    get_all_sources,
+)
+from sachi.sources.http import get_session_manager
+from sachi.sources.limiter import get_rate_limiters
+from sachi.templates import get_template_engine
+
+
+@dataclass
+class BatchItem:
+    file: SachiFile
+    match: SachiMatch | None = None
+    service: str | None = None
+    new_path: Path | None = None
+
+
+class BatchRenamer:
+    def __init__(
+        self,
+        file_or_dir: Path,
+        dry_run: bool = False,
+        sources: list[type[SachiSource]] | None = None,
+        plan: IO[bytes] | None = None,
+        verify: bool | None = None,
+    ):
+        self.file_or_dir = file_or_dir
+        self.base_dir = file_or_dir.parent if file_or_dir.is_file() else file_or_dir
+        self.dry_run = dry_run
+        self.plan = plan
+        self.verify = get_config().checksum.verify if verify is None else verify
+
+        self.sources: dict[MediaType, SachiSource] = {}
+        for source_cls in sources or get_all_sources():
+            self.sources.setdefault(source_cls.media_type, source_cls.get_instance())
+
+        # shared across lookup workers so each series is only resolved once
+        self._parents: dict[tuple, asyncio.Task[SachiParentModel | None]] = {}
+        self._episodes: dict[tuple, asyncio.Task[EpisodeIndex]] = {}
+        self._destinations: set[Path] = set()
+        self._pending: list[tuple[BatchItem, Path]] = []
+        self.journal = None if dry_run or plan else RenameJournal.create()
+
+        conf = get_config().pipeline
+        self.rename_stage = Stage(
+            "rename", self.rename, conf.rename_workers, conf.queue_size
+        )
+        self.pipeline = Pipeline(
+            [
+                Stage("guessit", self.guess, conf.guessit_workers, conf.queue_size),
+                Stage("lookup", self.lookup, conf.lookup_workers, conf.queue_size),
+                Stage("media", self.analyze, conf.media_workers, conf.queue_size),
+                Stage(
+                    "template", self.template, conf.template_workers, conf.queue_size
+                ),
+                self.rename_stage,
+            ],
+            on_error=self.on_error,
+        )
+
+    async def scan(self) -> AsyncGenerator[Path, None]:
+        batches = iter_batches(self.file_or_dir)
+        while batch := await asyncio.to_thread(next, batches, None):
+            for path in batch:
+                yield path
+
+    async def run(self) -> list[StageStats]:
+        try:
+            stats = await self.pipeline.run(self.scan())
+            await self._flush()
+            if self.journal is not None:
+                self.journal.finish()
+            return stats
+        finally:
+            get_filename_analyzer().shutdown()
+            get_media_analyzer().shutdown()
+            get_checksummer().shutdown()
+            await get_session_manager().close()
+            if self.journal is not None:
+                self.journal.close()
+
+    def on_error(self, stage: Stage, item: Any, error: Exception):
+        path = item.file.path if isinstance(item, BatchItem) else item
+        rich.print(f"[red]{stage.name}: {path}: {error!r}")
+
+    # Stages
+
+    async def guess(self, path: Path) -> BatchItem | None:
+        file = SachiFile(path, self.base_dir, lambda _: None)
+        # guessit runs on the analyzer's worker pool, never on the event loop
+        await get_filename_analyzer().analyze([file])
+        if file.filename_error is not None:
+            raise file.filename_error
+        if "title" not in file.guess:
+            return None
+        return BatchItem(file)
+
+    async def lookup(self, item: BatchItem) -> BatchItem | None:
+        guess = item.file.guess
+        match guess.get("type"):
+            case "episode":
+                media_type = MediaType.SERIES
+            case "movie":
+                media_type = MediaType.MOVIE
+            case _:
+                return None
+        source = self.sources.get(media_type)
+        if source is None:
+            return None
+
+        parent_key = (source.service, guess["title"], guess.get("year"))
+        if parent_key not in self._parents:
+            self._parents[parent_key] = asyncio.create_task(
+                self._search(source, guess["title"], guess.get("year"))
+            )
+        parent = await self._parents[parent_key]
+        if parent is None:
+            return None
+
+        episodes_key = (source.service, parent.ref_id)
+        if episodes_key not in self._episodes:
+            self._episodes[episodes_key] = asyncio.create_task(
+                self._index(source, parent)
+            )
+        index = await self._episodes[episodes_key]
+
+        if media_type == MediaType.MOVIE:
+            found = index.episodes[:1]
+        else:
+            found = index.find(guess)
+        if not found:
+            return None
+        item.match = SachiMatch(
+            parent=parent, episode=found[0], extra_episodes=found[1:]
+        )
+        item.service = source.service
+        return item
+
+    async def analyze(self, item: BatchItem) -> BatchItem:
+        assert item.match is not None
+        engine = get_template_engine()
+        if Provider.MEDIA in engine.providers(item.match.parent.media_type):
+            await get_media_analyzer().analyze(item.file)
+        if self.verify and "crc32" in item.file.guess:
+            if await item.file.verify() == Verification.MISMATCH:
+                raise ValueError(
+                    f"CRC32 is {item.file.ctx.crc32}, "
+                    f"the name says {item.file.guess['crc32']}"
+                )
+        return item
+
+    async def template(self, item: BatchItem) -> BatchItem:
+        item.file.match = item.match
+        item.new_path = await item.file.new_path
+        return item
+
+    async def rename(self, item: BatchItem) -> BatchItem:
+        # planned a batch at a time, so duplicates are numbered and checked
+        # against the tree like in the TUI
+        assert item.new_path is not None
+        self._pending.append((item, item.new_path))
+        if len(self._pending) >= APPLY_BATCH:
+            await self._flush()
+        return item
+
+    # Helpers
+
+    async def _flush(self):
+        pending, self._pending = self._pending, []
+        plan = await asyncio.to_thread(
+            plan_renames, [(item.file, new_path) for item, new_path in pending]
+        )
+        moves = []
+        for (item, _), planned in zip(pending, plan):
+            item.new_path = planned.dst
+            if planned.dst == item.file.path:
+                self.rename_stage.stats.processed -= 1
+                self.rename_stage.stats.skipped += 1
+                continue
+            if planned.collision is None and planned.dst in self._destinations:
+                planned.collision = "Another file renames to"
+            if planned.collision is not None:
+                error = FileExistsError(
+                    errno.EEXIST, planned.collision, str(planned.dst)
+                )
+                self._failed(item.file.path, error)
+                continue
+            self._destinations.add(planned.dst)
+            rich.print(
+                f"{item.file.path.relative_to(self.base_dir)} -> "
+                f"{planned.dst.relative_to(self.base_dir)}"
+            )
+            if self.plan is not None:
+                assert item.service is not None
+                record = PlanRecord.from_file(item.file, planned.dst, item.service)
+                write_plan_record(self.plan, record)
+            else:
+                moves.append(RenameOp(item.file.path, planned.dst))
+        await self._move(moves)
+
+    async def _move(self, moves: list[RenameOp]):
+        # each batch is journaled with a single fsync before any file moves
+        if not moves or self.journal is None:
+            return
+        ids = await asyncio.to_thread(
+            self.journal.plan, ((op.src, op.dst) for op in moves)
+        )
+        for op, journal_id in zip(moves, ids):
+            op.journal_id = journal_id
+        await RenameExecutor(
+            moves, self.rename_stage.concurrency, self._moved, self.journal
+        ).run()
+
+    def _moved(self, op: RenameOp, error: Exception | None):
+        if error is not None:
+            self._failed(op.src, error)
+
+    def _failed(self, path: Path, error: Exception):
+        self.rename_stage.stats.processed -= 1
+        self.rename_stage.stats.failed += 1
+        self.on_error(self.rename_stage, path, error)
+
+    async def _search(
+        self, source: SachiSource, title: str, year: int | None
+    ) -> SachiParentModel | None:
+        resolution = get_title_cache().resolve(source.service, title, year)
+        if resolution is not None:
+            if resolution.exact:
+                return resolution.parent
+            if resolution.confidence >= MIN_CONFIDENCE:
+                # a similar title can be another series, so search instead
+                rich.print(
+                    f'"{title}" resembles {resolution.parent.title} '
+                    f"({resolution.parent.year}), {resolution.confidence:.0%} "
+                    "confident, searching instead"
+                )
+        query = (
+            f"{title} ({year})"
+            if source.media_type == MediaType.MOVIE and year
+            else title
+        )
+        parents = await source.search(query)
+        if year is not None:
+            for parent in parents:
+                if parent.year == year:
+                    return parent
+        return parents[0] if parents else None
+
+    async def _index(
+        self, source: SachiSource, parent: SachiParentModel
+    ) -> EpisodeIndex:
+        return EpisodeIndex(await source.get_episodes(parent))
+
+
+def print_stats(stats: list[StageStats]):
+    table = Table(title="Pipeline throughput")
+    table.add_column("Stage")
+    table.add_column("Workers", justify="right")
+    table.add_column("Done", justify="right")
+    table.add_column("Skipped", justify="right")
+    table.add_column("Failed", justify="right")
+    table.add_column("Busy (s)", justify="right")
+    table.add_column("Rate (files/s)", justify="right")
+    for s in stats:
+        table.add_row(
+            s.name,
+            str(s.concurrency),
+            str(s.processed),
+            str(s.skipped),
+            str(s.failed),
+            f"{s.busy:.2f}",
+            f"{s.throughput:.1f}",
+        )
+    rich.print(table)
+    rich.print(f"HTTP: {get_session_manager().stats}")
+    for source_cls in get_all_sources():
+        coalesce = source_cls.coalesce_stats
+        rich.print(
+            f"{source_cls.service}: {coalesce.coalesced} of {coalesce.calls} "
+            "calls joined an in-flight request"
+        )
+    for service, limiter in get_rate_limiters().items():
+        rich.print(f"{service}: {limiter.stats}")
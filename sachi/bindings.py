@@ -0,0 +1,86 @@
+from dataclasses import fields
+from enum import StrEnum
+from typing import Any, Collection, Iterator, Mapping
+
+from sachi.context import FileBotContext
+
+CONTEXT_FIELDS = frozenset(f.name for f in fields(FileBotContext))
+
+
+class Provider(StrEnum):
+    FILENAME = "filename"
+    MEDIA = "media"
+    CHECKSUM = "checksum"
+
+
+PROVIDER_FIELDS: dict[Provider, frozenset[str]] = {
+    Provider.FILENAME: frozenset({"source"}),
+    Provider.MEDIA: frozenset(
+        {
+            "vcf",
+            "vc",
+            "ac",
+            "cf",
+            "vf",
+            "hpi",
+            "aco",
+            "acf",
+            "af",
+            "channels",
+            "resolution",
+            "width",
+            "height",
+            "bitdepth",
+            "hdr",
+            "dovi",
+            "bitrate",
+            "vbr",
+            "abr",
+            "fps",
+            "khz",
+            "ar",
+            "ws",
+            "hd",
+            "dt",
+            "s3d",
+            "mediaTitle",
+            "audioLanguages",
+            "textLanguages",
+            "duration",
+            "seconds",
+            "minutes",
+            "hours",
+            "media",
+            "video",
+            "audio",
+            "text",
+            "image",
+        }
+    ),
+    Provider.CHECKSUM: frozenset({"crc32"}),
+}
+
+
+def required_providers(variables: Collection[str]) -> frozenset[Provider]:
+    return frozenset(
+        provider
+        for provider, provided in PROVIDER_FIELDS.items()
+        if not provided.isdisjoint(variables)
+    )
+
+
+class ContextBindings(Mapping[str, Any]):
+    def __init__(self, ctx: FileBotContext, names: Collection[str]):
+        self.ctx = ctx
+        self.names = [name for name in names if name in CONTEXT_FIELDS]
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in CONTEXT_FIELDS:
+            raise KeyError(key)
+        return getattr(self.ctx, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import importlib
+import mmap
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import StrEnum
+from functools import cache
+from io import BufferedReader
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Literal, Protocol
+
+from sachi.config import get_app_dir, get_config
+from sachi.store import FileKey, FileStore
+
+type Algorithm = Literal["crc32", "sha1", "xxh64"]
+
+HASH_CHUNK = 8 * 1024 * 1024
+
+
+class Hasher(Protocol):
+    def update(self, data: Any, /) -> None: ...
+    def hexdigest(self) -> str: ...
+
+
+class Crc32:
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data: Any, /):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self) -> str:
+        return f"{self.value:08X}"
+
+
+def new_hasher(algorithm: Algorithm) -> Hasher:
+    match algorithm:
+        case "crc32":
+            return Crc32()
+        case "sha1":
+            return hashlib.sha1(usedforsecurity=False)
+        case "xxh64":
+            try:
+                xxhash = importlib.import_module("xxhash")
+            except ImportError as e:
+                raise RuntimeError("xxh64 checksums need the xxhash package") from e
+            return xxhash.xxh64()
+
+
+def _chunks(f: BufferedReader, size: int) -> Iterator[memoryview]:
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # empty files and some network filesystems cannot be mapped
+        buf = bytearray(HASH_CHUNK)
+        with memoryview(buf) as view:
+            while n := f.readinto(buf):
+                yield view[:n]
+        return
+    with mm, memoryview(mm) as view:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        for offset in range(0, size, HASH_CHUNK):
+            with view[offset : offset + HASH_CHUNK] as chunk:
+                yield chunk
+
+
+def hash_file(path: Path, algorithms: Iterable[Algorithm]) -> dict[Algorithm, str]:
+    # zlib and hashlib release the GIL on large buffers, so threads hash in parallel
+    hashers: dict[Algorithm, Hasher] = {
+        algorithm: new_hasher(algorithm) for algorithm in algorithms
+    }
+    with open(path, "rb") as f:
+        for chunk in _chunks(f, os.fstat(f.fileno()).st_size):
+            for hasher in hashers.values():
+                hasher.update(chunk)
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+
+
+class Verification(StrEnum):
+    OK = "ok"
+    MISMATCH = "mismatch"
+    UNKNOWN = "unknown"
+
+
+def verify_crc32(expected: str | None, actual: str) -> Verification:
+    if expected is None:
+        return Verification.UNKNOWN
+    if expected.upper() == actual.upper():
+        return Verification.OK
+    return Verification.MISMATCH
+
+
+@dataclass
+class ChecksumCacheStats:
+    entries: int
+    file_bytes: int
+
+
+class ChecksumCache(FileStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS checksums (
+        dev INTEGER NOT NULL,
+        ino INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        algorithm TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        path TEXT NOT NULL,
+        accessed REAL NOT NULL,
+        PRIMARY KEY (dev, ino, algorithm)
+    );
+    """
+    FILE_TABLE = "checksums"
+
+    def get(self, key: FileKey, path: Path | None = None) -> dict[Algorithm, str]:
+        with self.transaction() as conn:
+            return dict(self.select_file(conn, "algorithm, digest", key, path))
+
+    def put(self, key: FileKey, path: Path, digests: dict[Algorithm, str]):
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        key.dev,
+                        key.ino,
+                        key.size,
+                        key.mtime_ns,
+                        algorithm,
+                        digest,
+                        os.fspath(path),
+                        now,
+                    )
+                    for algorithm, digest in digests.items()
+                ],
+            )
+
+    def stats(self) -> ChecksumCacheStats:
+        with self.transaction() as conn:
+            (entries,) = conn.execute(
+                "SELECT count(DISTINCT dev || ':' || ino) FROM checksums"
+            ).fetchone()
+        return ChecksumCacheStats(entries, self.size_on_disk())
+
+
+@cache
+def get_checksum_cache() -> ChecksumCache:
+    return ChecksumCache(get_app_dir() / "checksums.sqlite")
+
+
+class Checksummer:
+    def __init__(self, workers: int = 2, algorithms: Iterable[Algorithm] = ("crc32",)):
+        self.workers = max(1, workers)
+        # crc32 is always computed, it is what templates and verification use
+        wanted: list[Algorithm] = ["crc32", *algorithms]
+        self.algorithms = tuple(dict.fromkeys(wanted))
+        self._executor: ThreadPoolExecutor | None = None
+        self._inflight: dict[Path, asyncio.Future[dict[Algorithm, str]]] = {}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="sachi-checksum"
+            )
+        return self._executor
+
+    async def checksum(self, path: Path) -> dict[Algorithm, str]:
+        fut = self._inflight.get(path)
+        if fut is None:
+            fut = asyncio.ensure_future(self._checksum(path))
+            self._inflight[path] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(path, None))
+        return await asyncio.shield(fut)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _checksum(self, path: Path) -> dict[Algorithm, str]:
+        checksum_cache = get_checksum_cache()
+        key = await asyncio.to_thread(FileKey.from_path, path)
+        digests = await asyncio.to_thread(checksum_cache.get, key, path)
+        missing: list[Algorithm] = [a for a in self.algorithms if a not in digests]
+        if missing:
+            loop = asyncio.get_running_loop()
+            computed = await loop.run_in_executor(
+                self.executor, hash_file, path, missing
+            )
+            await asyncio.to_thread(checksum_cache.put, key, path, computed)
+            digests |= computed
+        return digests
+
+
+@cache
+def get_checksummer() -> Checksummer:
+    conf = get_config().checksum
+    return Checksummer(conf.workers, conf.algorithms)
@@ -1,3 +1,6 @@
+import asyncio
+import contextlib
+import time
 from importlib.resources import files
 from pathlib import Path
 from typing import Annotated
@@ -7,9 +10,21 @@ import typer
 
 import sachi.resources
 from sachi.app import SachiApp
-from sachi.config import get_config_path
+from sachi.batch import BatchRenamer, print_stats
+from sachi.checksum import get_checksum_cache
+from sachi.config import get_config, get_config_path
+from sachi.journal import JournalState, RecordKind, RenameJournal, latest_journal
+from sachi.media import get_media_cache
+from sachi.planner import apply_plan, read_plan
+from sachi.renamer import RenameExecutor, RenameOp
+from sachi.resolver import get_title_cache
+from sachi.sources.base import get_all_sources
+from sachi.sources.cache import CacheMode, get_response_cache
+from sachi.sources.local import LocalIndexSource, get_series_index
 
 cli_app = typer.Typer()
+cache_app = typer.Typer(help="Inspect and prune the local caches")
+cli_app.add_typer(cache_app, name="cache")
 
 
 @cli_app.command()
@@ -35,6 +50,238 @@ def rename(
             readable=True,
         ),
     ],
+    auto: Annotated[
+        bool,
+        typer.Option(help="Match and rename without the TUI"),
+    ] = False,
+    dry_run: Annotated[
+        bool,
+        typer.Option(help="With --auto, only print the planned renames"),
+    ] = False,
+    refresh: Annotated[
+        bool,
+        typer.Option(help="Revalidate every cached source response"),
+    ] = False,
+    offline: Annotated[
+        bool,
+        typer.Option(help="Only use cached source responses"),
+    ] = False,
+    local: Annotated[
+        bool,
+        typer.Option(help="With --auto, match series against the local index"),
+    ] = False,
+    verify: Annotated[
+        bool | None,
+        typer.Option(
+            help="Check release CRCs in file names against the files, "
+            "defaults to checksum.verify in the config",
+        ),
+    ] = None,
 ):
-    app = SachiApp(file_or_dir)
+    if refresh and offline:
+        raise typer.BadParameter("--refresh and --offline are mutually exclusive")
+    if refresh:
+        get_response_cache().mode = CacheMode.REFRESH
+    elif offline:
+        get_response_cache().mode = CacheMode.OFFLINE
+    if auto:
+        sources = [LocalIndexSource, *get_all_sources()] if local else None
+        renamer = BatchRenamer(
+            file_or_dir, dry_run=dry_run, sources=sources, verify=verify
+        )
+        stats = asyncio.run(renamer.run())
+        print_stats(stats)
+        return
+    app = SachiApp(file_or_dir, verify=verify)
     app.run()
+
+
+@cli_app.command()
+def plan(
+    file_or_dir: Annotated[
+        Path,
+        typer.Argument(exists=True, file_okay=True, dir_okay=True, readable=True),
+    ],
+    output: Annotated[
+        Path,
+        typer.Argument(dir_okay=False, writable=True, help="JSON Lines plan to write"),
+    ],
+    local: Annotated[
+        bool,
+        typer.Option(help="Match series against the local index"),
+    ] = False,
+):
+    sources = [LocalIndexSource, *get_all_sources()] if local else None
+    with output.open("wb") as f:
+        renamer = BatchRenamer(file_or_dir, sources=sources, plan=f)
+        stats = asyncio.run(renamer.run())
+    print_stats(stats)
+    rich.print(f'Plan written to "{output}"')
+
+
+@cli_app.command()
+def apply(
+    plan: Annotated[
+        Path,
+        typer.Argument(exists=True, dir_okay=False, help="Plan from 'sachi plan'"),
+    ],
+):
+    def report(op: RenameOp, error: Exception | None):
+        if error is not None:
+            rich.print(f"[red]{op.src}: {error}")
+
+    journal = RenameJournal.create()
+    try:
+        progress = asyncio.run(
+            apply_plan(
+                read_plan(plan),
+                journal,
+                get_config().pipeline.rename_workers,
+                report,
+            )
+        )
+        journal.finish()
+    finally:
+        journal.close()
+    rich.print(f"Moved {progress.done} files, {progress.failed} failed")
+    if journal.path.exists():
+        rich.print(f'Journal "{journal.path}"')
+
+
+@cli_app.command()
+def index(
+    dump: Annotated[
+        Path | None,
+        typer.Option(
+            exists=True,
+            dir_okay=False,
+            readable=True,
+            help=(
+                "JSON lines file with one series per line: id, name, year, "
+                "aliases and TVDB-style episodes"
+            ),
+        ),
+    ] = None,
+    clear: Annotated[bool, typer.Option(help="Empty the index before loading")] = False,
+):
+    series_index = get_series_index()
+    if clear:
+        series_index.clear()
+    if dump is not None:
+        series, episodes = series_index.import_dump(dump)
+        source = f'"{dump}"'
+    else:
+        series, episodes = series_index.import_tvdb_cache(get_response_cache())
+        source = "the HTTP cache"
+    rich.print(f"Indexed {series} series and {episodes} episodes from {source}")
+    stats = series_index.stats()
+    rich.print(f'Index "{series_index.path}"')
+    rich.print(f"  series: {stats.series} ({stats.titles} titles)")
+    rich.print(f"  episodes: {stats.episodes}")
+    rich.print(f"  on disk: {stats.file_bytes / 1024:.1f} KiB")
+
+
+def load_journal(journal: Path | None) -> JournalState:
+    journal = journal or latest_journal()
+    if journal is None:
+        raise typer.BadParameter("No rename journal found")
+    rich.print(f'Journal "{journal}"')
+    state = RenameJournal.load(journal)
+    if not state.finished:
+        rich.print("[yellow]The run did not finish")
+    return state
+
+
+def replay(state: JournalState, ops: list[RenameOp], kind: RecordKind):
+    def report(op: RenameOp, error: Exception | None):
+        if error is not None:
+            rich.print(f"[red]{op.src}: {error}")
+
+    journal = RenameJournal(state.path)
+    executor = RenameExecutor(
+        ops, get_config().pipeline.rename_workers, report, journal, kind
+    )
+    try:
+        progress = asyncio.run(executor.run())
+        journal.finish()
+    finally:
+        journal.close()
+    rich.print(f"Moved {progress.done} files, {progress.failed} failed")
+
+
+@cli_app.command()
+def undo(
+    journal: Annotated[
+        Path | None,
+        typer.Argument(exists=True, dir_okay=False, help="Defaults to the last run"),
+    ] = None,
+):
+    state = load_journal(journal)
+    ops = [
+        RenameOp(dst, src, journal_id=op_id)
+        for op_id in reversed(state.applied())
+        for src, dst in [state.planned[op_id]]
+    ]
+    replay(state, ops, "undone")
+    # deepest first, and only the ones the moved files left empty
+    for directory in sorted(state.dirs, key=lambda d: len(d.parts), reverse=True):
+        with contextlib.suppress(OSError):
+            directory.rmdir()
+
+
+@cli_app.command()
+def resume(
+    journal: Annotated[
+        Path | None,
+        typer.Argument(exists=True, dir_okay=False, help="Defaults to the last run"),
+    ] = None,
+):
+    state = load_journal(journal)
+    ops = [
+        RenameOp(*state.planned[op_id], journal_id=op_id) for op_id in state.pending()
+    ]
+    replay(state, ops, "done")
+
+
+@cache_app.command("stats")
+def cache_stats():
+    media_cache = get_media_cache()
+    stats = media_cache.stats()
+    rich.print(f'Media cache "{media_cache.path}"')
+    rich.print(f"  entries: {stats.entries}")
+    rich.print(f"  track data: {stats.data_bytes / 1024:.1f} KiB")
+    rich.print(f"  on disk: {stats.file_bytes / 1024:.1f} KiB")
+
+    response_cache = get_response_cache()
+    http_stats = response_cache.stats()
+    rich.print(f'HTTP cache "{response_cache.path}"')
+    rich.print(f"  entries: {http_stats.entries} ({http_stats.fresh} fresh)")
+    rich.print(f"  responses: {http_stats.data_bytes / 1024:.1f} KiB")
+    rich.print(f"  on disk: {http_stats.file_bytes / 1024:.1f} KiB")
+
+    checksum_cache = get_checksum_cache()
+    checksum_stats = checksum_cache.stats()
+    rich.print(f'Checksum cache "{checksum_cache.path}"')
+    rich.print(f"  files: {checksum_stats.entries}")
+    rich.print(f"  on disk: {checksum_stats.file_bytes / 1024:.1f} KiB")
+
+    title_cache = get_title_cache()
+    rich.print(f'Title cache "{title_cache.path}"')
+    rich.print(f"  confirmed titles: {title_cache.count()}")
+
+
+@cache_app.command("prune")
+def cache_prune(
+    older_than: Annotated[
+        float | None,
+        typer.Option(help="Also drop entries not used for this many days"),
+    ] = None,
+    clear: Annotated[bool, typer.Option(help="Drop every entry")] = False,
+):
+    cutoff = time.time() - older_than * 86400 if older_than is not None else None
+    removed = get_media_cache().prune(older_than=cutoff, clear=clear)
+    rich.print(f"Removed {removed} media cache entries")
+    removed = get_response_cache().prune(older_than=cutoff, clear=clear)
+    rich.print(f"Removed {removed} HTTP cache entries")
+    removed = get_checksum_cache().prune(older_than=cutoff, clear=clear)
+    rich.print(f"Removed {removed} checksum cache entries")
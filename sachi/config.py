@@ -1,19 +1,27 @@
+from functools import cache
 from importlib.metadata import metadata
 from pathlib import Path
+from typing import Any, Callable, Literal
 
 import rich
 import tomlkit
 import typer
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
-def get_config_path() -> Path:
+@cache
+def get_app_dir() -> Path:
     if __package__ is None:
         raise ImportError("This module must be imported as a package")
     pkg_meta = metadata(__package__)
     app_dir = Path(typer.get_app_dir(pkg_meta["Name"]))
     app_dir.mkdir(parents=True, exist_ok=True)
-    config_path = app_dir / "config.toml"
+    return app_dir
+
+
+@cache
+def get_config_path() -> Path:
+    config_path = get_app_dir() / "config.toml"
     return config_path
 
 
@@ -34,10 +42,18 @@ class BaseConfig(BaseModel):
     general: "GeneralConfig"
     series: "SeriesConfig"
     movie: "MovieConfig"
+    pipeline: "PipelineConfig" = Field(default_factory=lambda: PipelineConfig())
+    analysis: "AnalysisConfig" = Field(default_factory=lambda: AnalysisConfig())
+    guessit: "GuessitConfig" = Field(default_factory=lambda: GuessitConfig())
+    http: "HttpConfig" = Field(default_factory=lambda: HttpConfig())
+    http_cache: "HttpCacheConfig" = Field(default_factory=lambda: HttpCacheConfig())
+    rate_limit: "RateLimitConfig" = Field(default_factory=lambda: RateLimitConfig())
+    checksum: "ChecksumConfig" = Field(default_factory=lambda: ChecksumConfig())
 
 
 class GeneralConfig(BaseModel):
     dark: bool = True
+    template_cache: bool = True
 
 
 class SeriesConfig(BaseModel):
@@ -46,3 +62,124 @@ class SeriesConfig(BaseModel):
 
 class MovieConfig(BaseModel):
     template: list[str]
+
+
+class PipelineConfig(BaseModel):
+    queue_size: int = 64
+    guessit_workers: int = 64
+    lookup_workers: int = 8
+    media_workers: int = 4
+    template_workers: int = 8
+    rename_workers: int = 4
+
+
+class AnalysisConfig(BaseModel):
+    workers: int = 4
+    executor: Literal["thread", "process"] = "thread"
+    prefetch: bool = True
+
+
+class GuessitConfig(BaseModel):
+    workers: int = 2
+    executor: Literal["thread", "process"] = "process"
+
+
+class HttpConfig(BaseModel):
+    limit: int = 100
+    limit_per_host: int = 8
+    dns_ttl: int = 300
+    keepalive_timeout: float = 30
+
+
+class HttpCacheConfig(BaseModel):
+    max_size_mb: int = 256
+    search_ttl: int = 24 * 60 * 60
+    episodes_ttl: int = 6 * 60 * 60
+
+
+class RateLimitConfig(BaseModel):
+    rate: float = 5
+    max_rate: float = 50
+    concurrency: int = 4
+    max_concurrency: int = 16
+    latency_target: float = 1.0
+
+
+class ChecksumConfig(BaseModel):
+    workers: int = 2
+    algorithms: list[Literal["crc32", "sha1", "xxh64"]] = ["crc32"]
+    verify: bool = False
+
+
+CHECK_INTERVAL = 1.0
+
+type ConfigSubscriber = Callable[["ConfigService"], None]
+
+
+class ConfigService:
+    def __init__(self, path: Path):
+        self.path = path
+        self.revision = 0
+        self.error: Exception | None = None
+        self._data: dict[str, Any] | None = None
+        self._model: BaseConfig | None = None
+        self._mtime_ns: int | None = None
+        self._subscribers: list[ConfigSubscriber] = []
+
+    @property
+    def data(self) -> dict[str, Any]:
+        self._ensure_loaded()
+        assert self._data is not None
+        return self._data
+
+    @property
+    def model(self) -> BaseConfig:
+        self._ensure_loaded()
+        assert self._model is not None
+        return self._model
+
+    def subscribe(self, callback: ConfigSubscriber) -> Callable[[], None]:
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def check(self) -> bool:
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if self._model is not None and mtime_ns == self._mtime_ns:
+            return False
+
+        first_load = self._model is None
+        try:
+            data = read_config().unwrap()
+            model = BaseConfig(**data)
+        except Exception as e:
+            # keep serving the last good config while the file is being edited
+            if first_load:
+                raise
+            self._mtime_ns = mtime_ns
+            self.error = e
+            return False
+        self._data, self._model, self._mtime_ns = data, model, mtime_ns
+        self.error = None
+        self.revision += 1
+        if not first_load:
+            for callback in list(self._subscribers):
+                callback(self)
+        return True
+
+    def _ensure_loaded(self):
+        # reloads only happen in check(), which the app polls from its event loop
+        # so that subscribers never run on a worker thread
+        if self._model is None:
+            self.check()
+
+
+@cache
+def get_config_service() -> ConfigService:
+    return ConfigService(get_config_path())
+
+
+def get_config() -> BaseConfig:
+    return get_config_service().model
@@ -4,8 +4,10 @@ from pathlib import Path
 from typing import Any
 
 
-@dataclass
+@dataclass(init=False)
 class FileBotContext:
+    # No generated __init__: unset fields resolve to the class-level None
+    # defaults, so each instance only stores the handful of values it sets.
     n: str | None = None
     """movie / series name (`Dark Angel`)"""
     
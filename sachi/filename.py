@@ -0,0 +1,112 @@
+import asyncio
+from collections import OrderedDict, defaultdict
+from functools import cache
+from typing import TYPE_CHECKING, Any, Iterable
+
+from guessit import guessit
+
+from sachi.config import get_config
+from sachi.pool import ExecutorKind, WorkerPool
+
+if TYPE_CHECKING:
+    from sachi.models import SachiFile
+
+type Guess = dict[str, Any]
+
+BATCH_SIZE = 64
+MEMO_SIZE = 100_000
+
+
+def guess_batch(names: list[str]) -> list[Guess]:
+    guesses = []
+    for name in names:
+        try:
+            guesses.append(dict(guessit(name)))
+        except Exception:
+            guesses.append({})
+    return guesses
+
+
+class FilenameAnalyzer:
+    def __init__(self, workers: int = 2, executor: ExecutorKind = "process"):
+        self.pool = WorkerPool(workers, executor, "sachi-guessit")
+
+        self._memo: OrderedDict[str, Guess] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future[Guess]] = {}
+        self._pending: list[str] = []
+
+        self.hits = 0
+        self.misses = 0
+
+    async def analyze(self, files: Iterable["SachiFile"]):
+        by_name: defaultdict[str, list["SachiFile"]] = defaultdict(list)
+        for file in files:
+            by_name[file.path.name].append(file)
+
+        futs = []
+        for name, named_files in by_name.items():
+            if (guess := self._memo.get(name)) is not None:
+                self._memo.move_to_end(name)
+                self.hits += len(named_files)
+                for file in named_files:
+                    file.apply_guess(guess)
+                continue
+            fut = self._inflight.get(name)
+            if fut is None:
+                self.misses += 1
+                fut = asyncio.get_running_loop().create_future()
+                self._inflight[name] = fut
+                self._pending.append(name)
+                if len(self._pending) == 1:
+                    # let concurrent callers join the same batch
+                    asyncio.get_running_loop().call_soon(self._flush)
+            self.hits += len(named_files) - 1
+            fut.add_done_callback(
+                lambda f, named_files=named_files: _apply(f, named_files)
+            )
+            futs.append(fut)
+        if futs:
+            # failures are recorded on the files themselves
+            await asyncio.gather(*futs, return_exceptions=True)
+
+    def warm_up(self):
+        self.pool.warm_up()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), BATCH_SIZE):
+            asyncio.create_task(self._run_batch(pending[i : i + BATCH_SIZE]))
+
+    async def _run_batch(self, names: list[str]):
+        loop = asyncio.get_running_loop()
+        try:
+            guesses = await loop.run_in_executor(self.pool.executor, guess_batch, names)
+        except Exception as e:
+            for name in names:
+                self._inflight.pop(name).set_exception(e)
+            return
+        for name, guess in zip(names, guesses):
+            self._memo[name] = guess
+            if len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+            self._inflight.pop(name).set_result(guess)
+
+
+def _apply(fut: asyncio.Future[Guess], files: list["SachiFile"]):
+    if fut.cancelled():
+        return
+    if (error := fut.exception()) is not None:
+        for file in files:
+            file.filename_analysis_failed(error)
+        return
+    for file in files:
+        file.apply_guess(fut.result())
+
+
+@cache
+def get_filename_analyzer() -> FilenameAnalyzer:
+    conf = get_config().guessit
+    return FilenameAnalyzer(conf.workers, conf.executor)
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Literal, TextIO
+
+from sachi.config import get_app_dir
+
+# done/undone records are only fsynced every this many, or when the run ends
+SYNC_EVERY = 64
+
+type RecordKind = Literal["done", "undone"]
+
+
+@dataclass
+class JournalState:
+    path: Path
+    planned: dict[int, tuple[Path, Path]] = field(default_factory=dict)
+    done: set[int] = field(default_factory=set)
+    undone: set[int] = field(default_factory=set)
+    dirs: list[Path] = field(default_factory=list)
+    finished: bool = False
+
+    def applied(self) -> list[int]:
+        # a crash can lose the last unsynced done records, so also trust the disk
+        return [
+            op_id
+            for op_id, (src, dst) in self.planned.items()
+            if op_id not in self.undone
+            and (op_id in self.done or (dst.exists() and not src.exists()))
+        ]
+
+    def pending(self) -> list[int]:
+        applied = set(self.applied())
+        return [
+            op_id
+            for op_id in self.planned
+            if op_id not in applied and op_id not in self.undone
+        ]
+
+
+def get_journal_dir() -> Path:
+    return get_app_dir() / "journal"
+
+
+def latest_journal() -> Path | None:
+    journal_dir = get_journal_dir()
+    if not journal_dir.is_dir():
+        return None
+    return max(journal_dir.glob("*.jsonl"), default=None)
+
+
+class RenameJournal:
+    def __init__(self, path: Path):
+        self.path = path
+        # opened by the first record, so a run that moves nothing leaves no journal
+        self._file: TextIO | None = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._written = 0
+        self._synced = 0
+        self._unsynced = 0
+
+    @classmethod
+    def create(cls) -> "RenameJournal":
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl"
+        return cls(get_journal_dir() / name)
+
+    @classmethod
+    def load(cls, path: Path) -> JournalState:
+        state = JournalState(path)
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a torn write from a crash, nothing after it was synced
+                    break
+                match record["kind"]:
+                    case "plan":
+                        state.planned[record["id"]] = (
+                            Path(record["src"]),
+                            Path(record["dst"]),
+                        )
+                    case "done":
+                        state.done.add(record["id"])
+                    case "undone":
+                        state.undone.add(record["id"])
+                    case "mkdir":
+                        state.dirs.append(Path(record["path"]))
+                    case "end":
+                        state.finished = True
+        return state
+
+    def plan(self, moves: Iterable[tuple[Path, Path]]) -> list[int]:
+        # planned moves must be durable before any file is touched
+        with self._lock:
+            records = []
+            ids = []
+            for src, dst in moves:
+                ids.append(self._next_id)
+                records.append(
+                    dict(
+                        kind="plan",
+                        id=self._next_id,
+                        src=str(src.absolute()),
+                        dst=str(dst.absolute()),
+                    )
+                )
+                self._next_id += 1
+        if records:
+            self._sync(self._write(records))
+        return ids
+
+    def created(self, dirs: Iterable[Path]):
+        # undo removes these again once the files have moved back out
+        records = [dict(kind="mkdir", path=str(path.absolute())) for path in dirs]
+        if records:
+            self._sync(self._write(records))
+
+    def record(self, kind: RecordKind, op_id: int):
+        seq = self._write([dict(kind=kind, id=op_id)])
+        with self._lock:
+            self._unsynced += 1
+            due = self._unsynced >= SYNC_EVERY
+        if due:
+            self._sync(seq)
+
+    def finish(self):
+        # only called when every move ran, a cancelled or crashed run lacks it
+        if self._file is not None:
+            self._sync(self._write([dict(kind="end")]))
+
+    def close(self):
+        if self._file is not None:
+            self._sync(self._written)
+            self._file.close()
+
+    def _write(self, records: list[dict]) -> int:
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = self.path.open("a", encoding="utf-8")
+            self._file.write(lines)
+            self._file.flush()
+            self._written += 1
+            return self._written
+
+    def _sync(self, seq: int):
+        # writers that queue up here are covered by whichever fsync runs first
+        with self._sync_lock:
+            if self._synced >= seq:
+                return
+            with self._lock:
+                target = self._written
+                self._unsynced = 0
+                assert self._file is not None
+            os.fsync(self._file.fileno())
+            self._synced = target
@@ -0,0 +1,97 @@
+import re
+from typing import Iterable
+
+from sachi.filename import Guess
+from sachi.models import SachiFile, SachiMatch
+from sachi.sources.base import SachiEpisodeModel, SachiParentModel
+
+NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+TRAILING_NUMBER_RE = re.compile(r"(\d+)\s*$")
+SPECIAL_DETAILS = frozenset({"Special", "Extras", "Bonus", "Omake", "OVA"})
+
+
+def normalize(title: str) -> str:
+    return NON_ALNUM_RE.sub("", title.lower())
+
+
+def as_list(value: int | list[int] | None) -> list[int]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+class EpisodeIndex:
+    def __init__(self, episodes: Iterable[SachiEpisodeModel]):
+        self.by_number: dict[tuple[int, int], SachiEpisodeModel] = {}
+        self.by_absolute: dict[int, SachiEpisodeModel] = {}
+        self.by_name: dict[tuple[int, str], SachiEpisodeModel] = {}
+        self.episodes = list(episodes)
+        regular = []
+        for ep in self.episodes:
+            self.by_number.setdefault((ep.season, ep.episode), ep)
+            if ep.name:
+                self.by_name.setdefault((ep.season, normalize(ep.name)), ep)
+            if ep.season > 0:
+                regular.append(ep)
+        regular.sort(key=lambda ep: (ep.season, ep.episode))
+        for i, ep in enumerate(regular, 1):
+            self.by_absolute[i] = ep
+
+    def find(self, guess: Guess) -> list[SachiEpisodeModel]:
+        seasons = as_list(guess.get("season"))
+        numbers = as_list(guess.get("episode"))
+        names = [guess.get("episode_title"), *as_list(guess.get("alternative_title"))]
+        names = [name for name in names if isinstance(name, str)]
+
+        if guess.get("episode_details") in SPECIAL_DETAILS:
+            # sources file specials under season 0 whatever the name says
+            if not numbers:
+                numbers = [
+                    int(m[1])
+                    for name in names
+                    if (m := TRAILING_NUMBER_RE.search(name))
+                ]
+            found = [self.by_number.get((0, n)) for n in numbers]
+            if any(found):
+                return [ep for ep in found if ep is not None]
+            seasons = [0, *seasons]
+
+        if not numbers:
+            # specials and extras are often only identified by their title
+            for season in seasons or [0]:
+                for name in names:
+                    if (ep := self.by_name.get((season, normalize(name)))) is not None:
+                        return [ep]
+            return []
+
+        if seasons:
+            found = [self.by_number.get((seasons[0], n)) for n in numbers]
+        else:
+            # no season in the name: season 1, or absolute numbering past it
+            found = [
+                self.by_number.get((1, n)) or self.by_absolute.get(n) for n in numbers
+            ]
+        return [ep for ep in found if ep is not None]
+
+
+def auto_match(
+    files: Iterable[SachiFile],
+    parent: SachiParentModel,
+    episodes: Iterable[SachiEpisodeModel],
+    titles: Iterable[str] = (),
+) -> list[SachiFile]:
+    index = EpisodeIndex(episodes)
+    wanted = {normalize(t) for t in (parent.title, *titles)}
+    matched = []
+    for file in files:
+        guess = file.guess
+        if file.match is not None or normalize(guess.get("title", "")) not in wanted:
+            continue
+        found = index.find(guess)
+        if not found:
+            continue
+        file.match = SachiMatch(
+            parent=parent, episode=found[0], extra_episodes=found[1:]
+        )
+        matched.append(file)
+    return matched
@@ -0,0 +1,97 @@
+import json
+import os
+import time
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+from pymediainfo import MediaInfo
+
+from sachi.config import get_app_dir
+from sachi.store import FileKey, FileStore
+
+type MediaTracks = dict[str, list[dict[str, Any]]]
+
+TRACK_KINDS = {
+    "general": "general_tracks",
+    "video": "video_tracks",
+    "audio": "audio_tracks",
+    "text": "text_tracks",
+}
+
+
+def extract_media(path: Path) -> MediaTracks:
+    media_info = MediaInfo.parse(path)
+    if isinstance(media_info, str):
+        raise RuntimeError(f"Failed to parse media info: {media_info}")
+    return {
+        kind: [track.to_data() for track in getattr(media_info, attr)]
+        for kind, attr in TRACK_KINDS.items()
+    }
+
+
+@dataclass
+class MediaCacheStats:
+    entries: int
+    data_bytes: int
+    file_bytes: int
+
+
+class MediaInfoCache(FileStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS media (
+        dev INTEGER NOT NULL,
+        ino INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        path TEXT NOT NULL,
+        tracks TEXT NOT NULL,
+        accessed REAL NOT NULL,
+        PRIMARY KEY (dev, ino)
+    );
+    """
+    FILE_TABLE = "media"
+
+    def get(self, key: FileKey, path: Path | None = None) -> MediaTracks | None:
+        with self.transaction() as conn:
+            rows = self.select_file(conn, "tracks", key, path)
+        return json.loads(rows[0][0]) if rows else None
+
+    def put(self, key: FileKey, path: Path, tracks: MediaTracks):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key.dev,
+                    key.ino,
+                    key.size,
+                    key.mtime_ns,
+                    os.fspath(path),
+                    json.dumps(tracks, default=str),
+                    time.time(),
+                ),
+            )
+
+    def lookup(self, path: Path) -> tuple[FileKey, MediaTracks | None]:
+        key = FileKey.from_path(path)
+        return key, self.get(key, path)
+
+    def get_or_extract(self, path: Path) -> MediaTracks:
+        key, tracks = self.lookup(path)
+        if tracks is None:
+            tracks = extract_media(path)
+            self.put(key, path, tracks)
+        return tracks
+
+    def stats(self) -> MediaCacheStats:
+        with self.transaction() as conn:
+            entries, data_bytes = conn.execute(
+                "SELECT count(*), coalesce(sum(length(tracks)), 0) FROM media"
+            ).fetchone()
+        return MediaCacheStats(entries, data_bytes, self.size_on_disk())
+
+
+@cache
+def get_media_cache() -> MediaInfoCache:
+    return MediaInfoCache(get_app_dir() / "mediainfo.sqlite")
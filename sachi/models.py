@@ -1,46 +1,57 @@
 import asyncio
-import re
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Callable, Self, assert_never, cast
+from typing import Any, Callable, Self
 
-import jinja2
-from guessit import guessit
-from pymediainfo import MediaInfo
 from rich.text import Text
 
-from sachi.config import BaseConfig, read_config
+from sachi.analysis import Priority, consume_exception, get_media_analyzer
+from sachi.bindings import ContextBindings, Provider
+from sachi.checksum import Verification, get_checksummer, verify_crc32
 from sachi.context import FileBotContext
+from sachi.filename import Guess
+from sachi.media import MediaTracks
 from sachi.sources.base import (
-    MediaType,
     SachiEpisodeModel,
     SachiParentModel,
 )
-
-FS_SPECIAL_CHARS = re.compile(r"[/\\:*\"?<>|]")
+from sachi.templates import get_template_engine
 
 
 @dataclass
 class SachiMatch:
     parent: SachiParentModel
     episode: SachiEpisodeModel
+    extra_episodes: list[SachiEpisodeModel] = field(default_factory=list)
+
+    @property
+    def episodes(self) -> list[SachiEpisodeModel]:
+        return [self.episode, *self.extra_episodes]
 
 
 class SachiFile:
     def __init__(
-        self, path: Path, base_dir: Path, set_rename_cell: Callable[[Any], None]
+        self,
+        path: Path,
+        base_dir: Path,
+        set_rename_cell: Callable[[Any], None],
+        set_check_cell: Callable[[Any], None] | None = None,
     ):
         self.path = path
         self.base_dir = base_dir
         self.set_rename_cell = set_rename_cell
+        self.set_check_cell = set_check_cell or (lambda _: None)
 
         self._match: SachiMatch | None = None
 
+        self.guess: Guess = {}
         self.ctx = FileBotContext()
-        self.analyze_filename()
+        self.filename_analysis_done = asyncio.Event()
+        self.filename_error: BaseException | None = None
         self.media_analysis_done = asyncio.Event()
 
-        self.new_path = asyncio.Future[Path]()
+        self.new_path = self._new_path_future()
+        self._template_task: asyncio.Task | None = None
 
     @property
     def match(self) -> SachiMatch | None:
@@ -53,8 +64,9 @@ class SachiFile:
         self.set_rename_cell(
             Text(
                 f"{value.parent.title} ({value.parent.year}) "
-                f"- {value.episode.season:02}x{value.episode.episode:02} "
-                f"- {value.episode.name}",
+                f"- {value.episode.season:02}x"
+                + "-".join(f"{ep.episode:02}" for ep in value.episodes)
+                + f" - {' & '.join(str(ep.name) for ep in value.episodes)}",
                 style="italic",
             )
             if value
@@ -62,38 +74,76 @@ class SachiFile:
         )
 
         self.analyze_match()
+        self.refresh_new_path()
 
-        if value is not None and not self.media_analysis_done.is_set():
-            asyncio.create_task(asyncio.to_thread(self.analyze_media))
-
+    def refresh_new_path(self):
+        # a pending path is handed over to the new task, which resolves it instead
+        if self._template_task is not None:
+            self._template_task.cancel()
         if self.new_path.done():
-            self.new_path = asyncio.Future[Path]()
-        asyncio.create_task(self.template_new_path())
+            self.new_path = self._new_path_future()
+        self._template_task = asyncio.create_task(self.template_new_path())
 
-    def analyze_filename(self):
-        guess = cast(dict, guessit(self.path.name))
+    def apply_guess(self, guess: Guess):
+        self.guess = guess
         self.ctx.source = guess.get("source", None)
-
-    def analyze_media(self):
-        media_info = MediaInfo.parse(self.path)
-        if isinstance(media_info, str):
-            raise RuntimeError(f"Failed to parse media info: {media_info}")
-
-        video = media_info.video_tracks[0]
-        self.ctx.resolution = f"{video.width}x{video.height}"
-        self.ctx.bitdepth = video.bit_depth
-        self.ctx.vc = video.encoded_library_name
-
-        audio = media_info.audio_tracks[0]
-        self.ctx.ac = audio.format
-        # FIXME:
-        if audio.other_channel_positions:
-            self.ctx.channels = ".".join(
-                audio.other_channel_positions[0].split("/")[:2]
-            )
+        self.filename_analysis_done.set()
+
+    def filename_analysis_failed(self, error: BaseException):
+        # waiters are released too, and check filename_error
+        self.filename_error = error
+        self.set_rename_cell(Text(f"Filename analysis failed: {error}", style="red"))
+        self.filename_analysis_done.set()
+
+    def apply_media(self, tracks: MediaTracks):
+        self.ctx.media = tracks["general"][0] if tracks["general"] else None
+        self.ctx.video = tracks["video"]
+        self.ctx.audio = tracks["audio"]
+        self.ctx.text = tracks["text"]
+
+        # audio-only and video-only files leave the other fields unset
+        if tracks["video"]:
+            video = tracks["video"][0]
+            self.ctx.resolution = f"{video.get('width')}x{video.get('height')}"
+            self.ctx.bitdepth = video.get("bit_depth")
+            self.ctx.vc = video.get("encoded_library_name")
+
+        if tracks["audio"]:
+            audio = tracks["audio"][0]
+            self.ctx.ac = audio.get("format")
+            # FIXME:
+            if audio.get("other_channel_positions"):
+                self.ctx.channels = ".".join(
+                    audio["other_channel_positions"][0].split("/")[:2]
+                )
 
         self.media_analysis_done.set()
 
+    def media_analysis_failed(self, error: Exception):
+        if self.match is not None:
+            self.set_rename_cell(Text(f"Media analysis failed: {error}", style="red"))
+
+    async def checksum(self) -> str:
+        digests = await get_checksummer().checksum(self.path)
+        self.ctx.crc32 = digests["crc32"]
+        return digests["crc32"]
+
+    async def verify(self) -> Verification:
+        try:
+            crc32 = await self.checksum()
+        except OSError as e:
+            self.set_check_cell(Text(f"Checksum failed: {e}", style="red"))
+            raise
+        verification = verify_crc32(self.guess.get("crc32"), crc32)
+        match verification:
+            case Verification.OK:
+                self.set_check_cell(Text(f"✓ {crc32}", style="green"))
+            case Verification.MISMATCH:
+                self.set_check_cell(Text(f"✗ {crc32}", style="bold red"))
+            case Verification.UNKNOWN:
+                self.set_check_cell(Text(crc32, style="dim"))
+        return verification
+
     def analyze_match(self):
         if self.match is None:
             return
@@ -103,37 +153,74 @@ class SachiFile:
         self.ctx.y = parent.year
 
         if episode is not None:
+            episodes = self.match.episodes
             self.ctx.s = episode.season
-            self.ctx.s00e00 = f"S{episode.season:02}E{episode.episode:02}"
-            self.ctx.t = episode.name
+            self.ctx.s00e00 = f"S{episode.season:02}" + "-".join(
+                f"E{ep.episode:02}" for ep in episodes
+            )
+            self.ctx.t = (
+                " & ".join(ep.name for ep in episodes if ep.name) or None
+                if len(episodes) > 1
+                else episode.name
+            )
 
     async def template_new_path(self):
         if self.match is None:
             return
-
-        await self.media_analysis_done.wait()
-
-        config = read_config()
-        config_model = BaseConfig(**config.unwrap())
-
-        match self.match.parent.media_type:
-            case MediaType.SERIES:
-                template_list = config_model.series.template
-            case MediaType.MOVIE:
-                template_list = config_model.movie.template
-            case _:
-                assert_never(self.match.parent.media_type)
-
-        new_path = self.base_dir
-        ctx_dict = asdict(self.ctx)
-        for part in template_list:
-            template = jinja2.Template(part)
-            segment = template.render(ctx_dict)
-            segment = FS_SPECIAL_CHARS.sub("", segment)
-            new_path /= segment
-        new_path = new_path.with_name(new_path.name + self.path.suffix)
-        self.set_rename_cell(str(new_path.relative_to(self.base_dir)))
-        self.new_path.set_result(new_path)
+        new_path = self.new_path
+        try:
+            path = await self._template_new_path()
+        except Exception as e:
+            # waiters on the path must not hang when a file cannot be renamed
+            if not new_path.done():
+                new_path.set_exception(e)
+            return
+        self.set_rename_cell(str(path.relative_to(self.base_dir)))
+        if not new_path.done():
+            new_path.set_result(path)
+
+    async def _template_new_path(self) -> Path:
+        assert self.match is not None
+        media_type = self.match.parent.media_type
+        engine = get_template_engine()
+
+        # only wait for the analyses the templates actually reference
+        providers = engine.providers(media_type)
+        if Provider.FILENAME in providers:
+            await self.filename_analysis_done.wait()
+            if self.filename_error is not None:
+                self.filename_analysis_failed(self.filename_error)
+                raise self.filename_error
+        if Provider.MEDIA in providers:
+            # failures are already reported in the rename cell
+            await get_media_analyzer().analyze(self, Priority.MATCHED)
+        if Provider.CHECKSUM in providers:
+            try:
+                await self.verify()
+            except Exception as e:
+                self.set_rename_cell(Text(f"Checksum failed: {e}", style="red"))
+                raise
+        try:
+            return self.render_new_path()
+        except Exception as e:
+            self.set_rename_cell(Text(f"Template failed: {e}", style="red"))
+            raise
+
+    def _new_path_future(self) -> asyncio.Future[Path]:
+        fut = asyncio.Future[Path]()
+        fut.add_done_callback(consume_exception)
+        return fut
+
+    def render_new_path(self) -> Path:
+        assert self.match is not None
+        media_type = self.match.parent.media_type
+        engine = get_template_engine()
+        return engine.render_path(
+            media_type,
+            ContextBindings(self.ctx, engine.variables(media_type)),
+            self.base_dir,
+            self.path.suffix,
+        )
 
     def __eq__(self, other: object):
         return isinstance(other, SachiFile) and self.path == other.path
@@ -0,0 +1,123 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Awaitable, Callable
+
+
+@dataclass
+class StageStats:
+    name: str
+    concurrency: int
+    processed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    busy: float = 0.0
+    started: float | None = None
+    finished: float | None = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+class _Done:
+    pass
+
+
+_DONE = _Done()
+
+
+class Stage[I, O]:
+    # `func` returning None drops the item from the pipeline
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[I], Awaitable[O | None]],
+        concurrency: int = 1,
+        maxsize: int = 0,
+    ):
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        self.queue = asyncio.Queue[I | _Done](maxsize)
+        self.stats = StageStats(name, self.concurrency)
+
+    async def _worker(
+        self, next_stage: "Stage[O, Any] | None", on_error: "ErrorHandler"
+    ):
+        while True:
+            item = await self.queue.get()
+            if isinstance(item, _Done):
+                return
+            if self.stats.started is None:
+                self.stats.started = time.perf_counter()
+            start = time.perf_counter()
+            try:
+                result = await self.func(item)
+            except Exception as e:
+                self.stats.failed += 1
+                on_error(self, item, e)
+                continue
+            finally:
+                self.stats.busy += time.perf_counter() - start
+            if result is None:
+                self.stats.skipped += 1
+                continue
+            self.stats.processed += 1
+            if next_stage is not None:
+                await next_stage.queue.put(result)
+
+    async def run(self, next_stage: "Stage[O, Any] | None", on_error: "ErrorHandler"):
+        async with asyncio.TaskGroup() as tg:
+            for _ in range(self.concurrency):
+                tg.create_task(self._worker(next_stage, on_error))
+        self.stats.finished = time.perf_counter()
+        if next_stage is not None:
+            for _ in range(next_stage.concurrency):
+                await next_stage.queue.put(_DONE)
+
+
+type ErrorHandler = Callable[[Stage, Any, Exception], None]
+
+
+def _ignore_error(stage: Stage, item: Any, error: Exception):
+    pass
+
+
+class Pipeline:
+    def __init__(
+        self, stages: list[Stage[Any, Any]], on_error: ErrorHandler = _ignore_error
+    ):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.on_error = on_error
+        self.source_stats = StageStats("scan", 1)
+
+    @property
+    def stats(self) -> list[StageStats]:
+        return [self.source_stats, *(stage.stats for stage in self.stages)]
+
+    async def _feed(self, source: AsyncIterable[Any]):
+        first = self.stages[0]
+        self.source_stats.started = time.perf_counter()
+        async for item in source:
+            self.source_stats.processed += 1
+            await first.queue.put(item)
+        self.source_stats.finished = time.perf_counter()
+        self.source_stats.busy = self.source_stats.elapsed
+        for _ in range(first.concurrency):
+            await first.queue.put(_DONE)
+
+    async def run(self, source: AsyncIterable[Any]) -> list[StageStats]:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(self._feed(source))
+            for stage, next_stage in zip(self.stages, [*self.stages[1:], None]):
+                tg.create_task(stage.run(next_stage, self.on_error))
+        return self.stats
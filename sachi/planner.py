@@ -0,0 +1,160 @@
+import errno
+import itertools
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable, Iterator
+
+from pydantic import TypeAdapter
+
+from sachi.bindings import ContextBindings
+from sachi.journal import RenameJournal
+from sachi.models import SachiFile
+from sachi.renamer import RenameExecutor, RenameOp, RenameProgress
+from sachi.sources.base import SachiEpisodeModel, SachiParentModel
+from sachi.templates import get_template_engine
+
+DUPLICATE_FIELDS = frozenset({"di", "dc"})
+# plan records are applied this many at a time, whatever the size of the plan
+APPLY_BATCH = 1024
+
+
+@dataclass
+class PlannedRename:
+    file: SachiFile
+    dst: Path
+    collision: str | None = None
+
+
+def list_dirs(dirs: Iterable[Path]) -> dict[Path, set[str]]:
+    listing: dict[Path, set[str]] = {}
+    for directory in dirs:
+        try:
+            with os.scandir(directory) as it:
+                listing[directory] = {entry.name for entry in it}
+        except OSError:
+            listing[directory] = set()
+    return listing
+
+
+def _group(plan: list[PlannedRename]) -> dict[Path, list[PlannedRename]]:
+    groups: defaultdict[Path, list[PlannedRename]] = defaultdict(list)
+    for planned in plan:
+        groups[planned.dst].append(planned)
+    return groups
+
+
+def plan_renames(items: Iterable[tuple[SachiFile, Path]]) -> list[PlannedRename]:
+    plan = [PlannedRename(file, dst) for file, dst in items]
+    engine = get_template_engine()
+
+    groups = _group(plan)
+    for group in groups.values():
+        # a file already at its destination keeps it, otherwise the first by path
+        group.sort(
+            key=lambda planned: (planned.dst != planned.file.path, planned.file.path)
+        )
+        for i, planned in enumerate(group, 1):
+            planned.file.ctx.di = i
+            planned.file.ctx.dc = len(group)
+
+    # templates that use di/dc render differently now that they are known
+    rerendered = False
+    for planned in plan:
+        assert planned.file.match is not None
+        media_type = planned.file.match.parent.media_type
+        if not DUPLICATE_FIELDS.isdisjoint(engine.variables(media_type)):
+            planned.dst = planned.file.render_new_path()
+            rerendered = True
+    if rerendered:
+        groups = _group(plan)
+
+    sources = {planned.file.path for planned in plan}
+    listing = list_dirs({planned.dst.parent for planned in plan})
+    for dst, group in groups.items():
+        first, *duplicates = group
+        for planned in duplicates:
+            planned.collision = f"Same destination as {first.file.path.name}"
+        if dst.name in listing[dst.parent] and dst != first.file.path:
+            # a file that is itself being renamed may still be there when we get to it
+            reason = "being renamed" if dst in sources else "already exists"
+            first.collision = f"Destination {reason}"
+    return plan
+
+
+@dataclass
+class PlanRecord:
+    src: Path
+    dst: Path
+    service: str
+    parent: SachiParentModel
+    episodes: list[SachiEpisodeModel]
+    context: dict[str, Any]
+
+    @classmethod
+    def from_file(cls, file: SachiFile, dst: Path, service: str) -> "PlanRecord":
+        assert file.match is not None
+        variables = get_template_engine().variables(file.match.parent.media_type)
+        return cls(
+            src=file.path.absolute(),
+            dst=dst.absolute(),
+            service=service,
+            parent=file.match.parent,
+            episodes=file.match.episodes,
+            context=dict(ContextBindings(file.ctx, variables)),
+        )
+
+
+PLAN_ADAPTER = TypeAdapter(PlanRecord)
+
+
+def write_plan_record(f: IO[bytes], record: PlanRecord):
+    f.write(PLAN_ADAPTER.dump_json(record, fallback=str) + b"\n")
+
+
+def read_plan(path: Path) -> Iterator[PlanRecord]:
+    with path.open("rb") as f:
+        for line in f:
+            if line.strip():
+                yield PLAN_ADAPTER.validate_json(line)
+
+
+async def apply_plan(
+    records: Iterable[PlanRecord],
+    journal: RenameJournal,
+    workers: int = 4,
+    on_done: Callable[[RenameOp, Exception | None], None] | None = None,
+) -> RenameProgress:
+    total = RenameProgress(0)
+    for batch in itertools.batched(records, APPLY_BATCH):
+        # plans can be edited by hand, so two records may still share a
+        # destination; across batches the executor refuses to overwrite
+        destinations: set[Path] = set()
+        ops = []
+        for record in batch:
+            if record.src == record.dst:
+                continue
+            op = RenameOp(record.src, record.dst)
+            if op.dst in destinations:
+                total.total += 1
+                total.failed += 1
+                if on_done is not None:
+                    on_done(
+                        op,
+                        FileExistsError(
+                            errno.EEXIST, "Another file renames to", str(op.dst)
+                        ),
+                    )
+                continue
+            destinations.add(op.dst)
+            ops.append(op)
+        ids = journal.plan((op.src, op.dst) for op in ops)
+        for op, journal_id in zip(ops, ids):
+            op.journal_id = journal_id
+        progress = await RenameExecutor(ops, workers, on_done, journal).run()
+        total.total += progress.total
+        total.done += progress.done
+        total.failed += progress.failed
+        total.cross_device += progress.cross_device
+    return total
@@ -0,0 +1,39 @@
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Literal, assert_never
+
+type ExecutorKind = Literal["thread", "process"]
+
+
+class WorkerPool:
+    def __init__(self, workers: int, kind: ExecutorKind, name: str):
+        self.workers = max(1, workers)
+        self.kind: ExecutorKind = kind
+        self.name = name
+        self._executor: Executor | None = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._create_executor()
+        return self._executor
+
+    def warm_up(self):
+        if self.kind == "process":
+            self._executor = self._executor or self._create_executor()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _create_executor(self) -> Executor:
+        match self.kind:
+            case "thread":
+                return ThreadPoolExecutor(self.workers, thread_name_prefix=self.name)
+            case "process":
+                return ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            case _:
+                assert_never(self.kind)
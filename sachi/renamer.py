@@ -0,0 +1,240 @@
+import asyncio
+import contextlib
+import errno
+import os
+import shutil
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from sachi.journal import RecordKind, RenameJournal
+
+COPY_CHUNK = 64 * 1024 * 1024
+CROSS_DEVICE_WORKERS = 2
+UNSUPPORTED_ERRNOS = frozenset(
+    {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSOCK}
+)
+# filesystems without hard links, such as FAT and some network mounts
+NO_LINK_ERRNOS = frozenset(
+    {errno.EPERM, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EMLINK}
+)
+
+
+class RenameCancelled(Exception):
+    pass
+
+
+@dataclass
+class RenameOp:
+    src: Path
+    dst: Path
+    tag: Any = None
+    journal_id: int | None = None
+
+
+@dataclass
+class RenameProgress:
+    total: int
+    done: int = 0
+    failed: int = 0
+    cross_device: int = 0
+
+    def __str__(self) -> str:
+        text = f"{self.done + self.failed}/{self.total}"
+        if self.failed:
+            text += f", {self.failed} failed"
+        return text
+
+
+def _copy_chunk(fd_in: int, fd_out: int, offset: int, count: int, state: list[str]):
+    # fall through the zero-copy syscalls the platform and filesystems support
+    while True:
+        method = state[0]
+        try:
+            match method:
+                case "copy_file_range":
+                    return os.copy_file_range(fd_in, fd_out, count)
+                case "sendfile":
+                    return os.sendfile(fd_out, fd_in, offset, count)
+                case _:
+                    data = os.pread(fd_in, min(count, 1024 * 1024), offset)
+                    return os.write(fd_out, data)
+        except OSError as e:
+            if method == "read" or e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            state[0] = "sendfile" if method == "copy_file_range" else "read"
+            # the next method starts from the bytes confirmed so far
+            os.lseek(fd_in, offset, os.SEEK_SET)
+
+
+def copy_file(src: Path, dst: Path, cancelled: threading.Event | None = None):
+    state = ["copy_file_range" if hasattr(os, "copy_file_range") else "sendfile"]
+    with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+        try:
+            size = os.fstat(fsrc.fileno()).st_size
+            copied = 0
+            while copied < size:
+                if cancelled is not None and cancelled.is_set():
+                    raise RenameCancelled(src)
+                n = _copy_chunk(
+                    fsrc.fileno(),
+                    fdst.fileno(),
+                    copied,
+                    min(COPY_CHUNK, size - copied),
+                    state,
+                )
+                if n == 0:
+                    break
+                copied += n
+            os.fsync(fdst.fileno())
+            if os.fstat(fdst.fileno()).st_size != size:
+                raise OSError(errno.EIO, "Copied size does not match", str(dst))
+        except BaseException:
+            dst.unlink(missing_ok=True)
+            raise
+    shutil.copystat(src, dst)
+
+
+def missing_dirs(path: Path) -> list[Path]:
+    missing = []
+    while not path.exists():
+        missing.append(path)
+        path = path.parent
+    return missing
+
+
+def rename_noreplace(src: Path, dst: Path):
+    # os.rename silently replaces dst, and on a case-insensitive filesystem dst
+    # can be another file whose name only differs in case, so link and unlink
+    try:
+        os.link(src, dst, follow_symlinks=False)
+    except FileExistsError:
+        if src.name == dst.name or not os.path.samefile(src, dst):
+            raise
+        # a case-only rename of the file itself
+        os.rename(src, dst)
+        return
+    except OSError as e:
+        if e.errno not in NO_LINK_ERRNOS:
+            raise
+        if dst.exists():
+            raise FileExistsError(errno.EEXIST, "Destination exists", str(dst))
+        os.rename(src, dst)
+        return
+    os.unlink(src)
+
+
+def move(src: Path, dst: Path, cancelled: threading.Event | None = None) -> bool:
+    # returns whether the file had to be copied to another filesystem
+    try:
+        rename_noreplace(src, dst)
+        return False
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    copy_file(src, dst, cancelled)
+    src.unlink()
+    return True
+
+
+class RenameExecutor:
+    def __init__(
+        self,
+        ops: list[RenameOp],
+        workers: int = 4,
+        on_done: Callable[[RenameOp, Exception | None], None] | None = None,
+        journal: RenameJournal | None = None,
+        journal_kind: RecordKind = "done",
+    ):
+        self.ops = ops
+        self.workers = max(1, workers)
+        self.on_done = on_done
+        self.journal = journal
+        self.journal_kind: RecordKind = journal_kind
+        self.progress = RenameProgress(len(ops))
+        self._cancelled = threading.Event()
+
+    async def run(self) -> RenameProgress:
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(self.workers, thread_name_prefix="sachi-rename")
+        try:
+            groups = await loop.run_in_executor(pool, self._prepare)
+            async with asyncio.TaskGroup() as tg:
+                for (src_dev, dst_dev), ops in groups.items():
+                    cross_device = src_dev != dst_dev
+                    limit = asyncio.Semaphore(
+                        CROSS_DEVICE_WORKERS if cross_device else self.workers
+                    )
+                    for op in ops:
+                        tg.create_task(self._run_op(pool, limit, op))
+        except asyncio.CancelledError:
+            # let running copies stop at their next chunk, and wait for them so
+            # every move that did happen is reported and journaled
+            self._cancelled.set()
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+            raise
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return self.progress
+
+    def _apply(self, op: RenameOp) -> bool:
+        copied = move(op.src, op.dst, self._cancelled)
+        if self.journal is not None and op.journal_id is not None:
+            self.journal.record(self.journal_kind, op.journal_id)
+        return copied
+
+    def _prepare(self) -> dict[tuple[int, int], list[RenameOp]]:
+        # one mkdir and one stat per directory, not per file
+        dir_devs: dict[Path, int] = {}
+        src_devs: dict[Path, int] = {}
+        created: list[Path] = []
+        groups: defaultdict[tuple[int, int], list[RenameOp]] = defaultdict(list)
+        for op in self.ops:
+            parent = op.dst.parent
+            if parent not in dir_devs:
+                try:
+                    created.extend(missing_dirs(parent))
+                    parent.mkdir(parents=True, exist_ok=True)
+                    dir_devs[parent] = parent.stat().st_dev
+                except OSError:
+                    dir_devs[parent] = -1
+            src_parent = op.src.parent
+            if src_parent not in src_devs:
+                try:
+                    src_devs[src_parent] = src_parent.stat().st_dev
+                except OSError:
+                    src_devs[src_parent] = -1
+            groups[(src_devs[src_parent], dir_devs[parent])].append(op)
+        if self.journal is not None:
+            self.journal.created(created)
+        return groups
+
+    async def _run_op(
+        self, pool: ThreadPoolExecutor, limit: asyncio.Semaphore, op: RenameOp
+    ):
+        loop = asyncio.get_running_loop()
+        async with limit:
+            job = pool.submit(self._apply, op)
+            # the job reports itself, so a move still counts if the run is cancelled
+            job.add_done_callback(
+                lambda job: loop.call_soon_threadsafe(self._finish, op, job)
+            )
+            with contextlib.suppress(Exception):
+                await asyncio.wrap_future(job)
+
+    def _finish(self, op: RenameOp, job: Future[bool]):
+        if job.cancelled():
+            return
+        error = None
+        try:
+            if job.result():
+                self.progress.cross_device += 1
+            self.progress.done += 1
+        except Exception as e:
+            error = e
+            self.progress.failed += 1
+        if self.on_done is not None:
+            self.on_done(op, error)
@@ -0,0 +1,142 @@
+import json
+import time
+from dataclasses import dataclass
+from functools import cache
+
+from sachi.config import get_app_dir
+from sachi.sources.base import MediaType, SachiParentModel
+from sachi.sources.local import WORD_RE, fts_phrase
+from sachi.store import SqliteStore
+
+MIN_CONFIDENCE = 0.8
+CANDIDATES = 10
+YEAR_MISMATCH_PENALTY = 0.5
+
+
+@dataclass
+class Resolution:
+    parent: SachiParentModel
+    confidence: float
+    confirmed: int
+    # only the same title and year is taken without asking
+    exact: bool
+
+
+def title_key(title: str) -> str:
+    return " ".join(WORD_RE.findall(title.lower()))
+
+
+def trigrams(key: str) -> set[str]:
+    return {key[i : i + 3] for i in range(len(key) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    a_grams, b_grams = trigrams(a), trigrams(b)
+    if not a_grams or not b_grams:
+        return float(a == b)
+    return 2 * len(a_grams & b_grams) / (len(a_grams) + len(b_grams))
+
+
+class TitleCache(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS resolutions (
+        id INTEGER PRIMARY KEY,
+        service TEXT NOT NULL,
+        key TEXT NOT NULL,
+        year INTEGER,
+        media_type TEXT NOT NULL,
+        ref_id TEXT NOT NULL,
+        title TEXT NOT NULL,
+        parent_year INTEGER,
+        confirmed INTEGER NOT NULL,
+        updated REAL NOT NULL,
+        UNIQUE (service, key)
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS resolutions_trigrams USING fts5(
+        key, content='resolutions', content_rowid='id', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS resolutions_insert
+    AFTER INSERT ON resolutions BEGIN
+        INSERT INTO resolutions_trigrams (rowid, key) VALUES (new.id, new.key);
+    END;
+    CREATE TRIGGER IF NOT EXISTS resolutions_delete
+    AFTER DELETE ON resolutions BEGIN
+        INSERT INTO resolutions_trigrams (resolutions_trigrams, rowid, key)
+            VALUES ('delete', old.id, old.key);
+    END;
+    """
+
+    def confirm(
+        self, service: str, title: str, year: int | None, parent: SachiParentModel
+    ):
+        key = title_key(title)
+        if not key:
+            return
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO resolutions (service, key, year, media_type, ref_id, "
+                "title, parent_year, confirmed, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (service, key) DO UPDATE SET "
+                "year = excluded.year, media_type = excluded.media_type, "
+                "ref_id = excluded.ref_id, title = excluded.title, "
+                "parent_year = excluded.parent_year, "
+                "confirmed = confirmed + 1, updated = excluded.updated",
+                (
+                    service,
+                    key,
+                    year,
+                    parent.media_type,
+                    json.dumps(parent.ref_id),
+                    parent.title,
+                    parent.year,
+                    time.time(),
+                ),
+            )
+
+    def resolve(
+        self, service: str, title: str, year: int | None = None
+    ) -> Resolution | None:
+        key = title_key(title)
+        if not key:
+            return None
+        with self.transaction() as conn:
+            rows = conn.execute(
+                "SELECT key, year, media_type, ref_id, title, parent_year, confirmed "
+                "FROM resolutions WHERE service = ? AND key = ?",
+                (service, key),
+            ).fetchall()
+            if not rows and (grams := trigrams(key)):
+                rows = conn.execute(
+                    "SELECT r.key, r.year, r.media_type, r.ref_id, r.title, "
+                    "r.parent_year, r.confirmed "
+                    "FROM (SELECT rowid, rank FROM resolutions_trigrams "
+                    "WHERE resolutions_trigrams MATCH ? ORDER BY rank LIMIT ?) f "
+                    "JOIN resolutions r ON r.id = f.rowid WHERE r.service = ?",
+                    (" OR ".join(map(fts_phrase, grams)), CANDIDATES, service),
+                ).fetchall()
+
+        best: Resolution | None = None
+        for row_key, row_year, media_type, ref_id, name, parent_year, confirmed in rows:
+            confidence = similarity(key, row_key)
+            if year is not None and row_year is not None and year != row_year:
+                confidence *= YEAR_MISMATCH_PENALTY
+            exact = row_key == key and row_year == year
+            if best is None or (exact, confidence) > (best.exact, best.confidence):
+                parent = SachiParentModel(
+                    media_type=MediaType(media_type),
+                    ref_id=json.loads(ref_id),
+                    title=name,
+                    year=parent_year,
+                )
+                best = Resolution(parent, confidence, confirmed, exact)
+        return best
+
+    def count(self) -> int:
+        with self.transaction() as conn:
+            return conn.execute("SELECT count(*) FROM resolutions").fetchone()[0]
+
+
+@cache
+def get_title_cache() -> TitleCache:
+    return TitleCache(get_app_dir() / "titles.sqlite")
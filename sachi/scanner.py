@@ -0,0 +1,94 @@
+import os
+from pathlib import Path
+from typing import Collection, Generator
+
+VIDEO_EXTENSIONS = frozenset(
+    {
+        ".3gp",
+        ".avi",
+        ".divx",
+        ".flv",
+        ".m2ts",
+        ".m4v",
+        ".mkv",
+        ".mov",
+        ".mp4",
+        ".mpeg",
+        ".mpg",
+        ".ogm",
+        ".ts",
+        ".webm",
+        ".wmv",
+    }
+)
+SUBTITLE_EXTENSIONS = frozenset(
+    {".ass", ".idx", ".srt", ".ssa", ".sub", ".sup", ".vtt"}
+)
+MEDIA_EXTENSIONS = VIDEO_EXTENSIONS | SUBTITLE_EXTENSIONS
+
+BATCH_SIZE = 256
+
+
+def iter_files(
+    file_or_dir: Path, extensions: Collection[str] = MEDIA_EXTENSIONS
+) -> Generator[Path, None, None]:
+    if file_or_dir.name.startswith("."):
+        return
+    if file_or_dir.is_file():
+        yield file_or_dir
+    elif file_or_dir.is_dir():
+        yield from _walk(file_or_dir, extensions)
+    else:
+        raise RuntimeError(f"Invalid file or directory: {file_or_dir}")
+
+
+def iter_batches(
+    file_or_dir: Path,
+    batch_size: int = BATCH_SIZE,
+    extensions: Collection[str] = MEDIA_EXTENSIONS,
+) -> Generator[list[Path], None, None]:
+    batch = []
+    for path in iter_files(file_or_dir, extensions):
+        batch.append(path)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _walk(root: Path, extensions: Collection[str]) -> Generator[Path, None, None]:
+    # One stat per directory (to break symlink/bind mount loops), none per file:
+    # file entries are classified from the dirent type and their extension.
+    seen: set[tuple[int, int]] = set()
+    stack = [os.fspath(root)]
+    while stack:
+        dir_path = stack.pop()
+        try:
+            st = os.stat(dir_path)
+        except OSError:
+            continue
+        if (st.st_dev, st.st_ino) in seen:
+            continue
+        seen.add((st.st_dev, st.st_ino))
+
+        try:
+            entries = os.scandir(dir_path)
+        except OSError:
+            continue
+        subdirs = []
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif (
+                        os.path.splitext(entry.name)[1].lower() in extensions
+                        and entry.is_file()
+                    ):
+                        yield Path(entry.path)
+                except OSError:
+                    continue
+        stack.extend(reversed(subdirs))
@@ -6,7 +6,6 @@ from textual.containers import Horizontal, Vertical
 from textual.reactive import reactive
 from textual.screen import ModalScreen, Screen
 from textual.widgets import (
-    DataTable,
     Footer,
     Header,
     Input,
@@ -17,7 +16,10 @@ from textual.widgets import (
     SelectionList,
 )
 
-from sachi.models import SachiMatch
+from sachi.config import CHECK_INTERVAL
+from sachi.matcher import auto_match
+from sachi.models import SachiFile, SachiMatch
+from sachi.resolver import MIN_CONFIDENCE, get_title_cache, similarity, title_key
 from sachi.screens.rename import RenameScreen
 from sachi.sources.base import (
     SachiEpisodeModel,
@@ -25,6 +27,8 @@ from sachi.sources.base import (
     SachiSource,
     get_all_sources,
 )
+from sachi.sources.limiter import get_rate_limiters
+from sachi.widgets import VirtualTable
 
 
 class ParentSelectionModal(ModalScreen[SachiParentModel]):
@@ -49,6 +53,7 @@ class EpisodesScreen(Screen):
     BINDINGS = [
         ("a", "append_selection", "Append Selection"),
         ("r", "replace_selection", "Replace Selection"),
+        ("m", "auto_match", "Auto Match"),
     ]
 
     sachi_source: reactive[SachiSource | None] = reactive(None)
@@ -75,12 +80,48 @@ class EpisodesScreen(Screen):
 
     # Methods
 
+    def confirm_titles(self, files: list[SachiFile]):
+        if self.sachi_source is None or self.sachi_parent is None:
+            return
+        # selections are assigned by position, so only titles that actually look
+        # like the chosen series or the search are remembered for it
+        query = self.query_one("#search-input", Input).value
+        keys = [title_key(self.sachi_parent.title), title_key(query)]
+        seen = set()
+        for file in files:
+            title, year = file.guess.get("title"), file.guess.get("year")
+            if title is None or (title, year) in seen:
+                continue
+            seen.add((title, year))
+            key = title_key(title)
+            if max(similarity(key, k) for k in keys) >= MIN_CONFIDENCE:
+                get_title_cache().confirm(
+                    self.sachi_source.service, title, year, self.sachi_parent
+                )
+
     def deselect_all(self):
         sel_list = self.query_one(SelectionList[int])
         sel_list.deselect_all()
 
+    def show_rate_limit(self):
+        if self.sachi_source is None:
+            return
+        service = self.sachi_source.service
+        limiter = get_rate_limiters().get(service)
+        if limiter is None:
+            return
+        stats = limiter.stats
+        if stats.in_flight or stats.waiting:
+            self.sub_title = f"{self.SUB_TITLE} ({service}: {stats})"
+            self.log(f"{service}: {stats}")
+        else:
+            self.sub_title = self.SUB_TITLE
+
     # Event handlers
 
+    def on_mount(self):
+        self.set_interval(CHECK_INTERVAL, self.show_rate_limit)
+
     @work
     @on(Input.Submitted, "#search-input")
     async def search(self, event: Input.Submitted):
@@ -93,6 +134,9 @@ class EpisodesScreen(Screen):
         self.sachi_parent = await self.app.push_screen_wait(
             ParentSelectionModal(parents)
         )
+        get_title_cache().confirm(
+            self.sachi_source.service, event.value, None, self.sachi_parent
+        )
 
         self.sachi_episodes = await self.sachi_source.get_episodes(self.sachi_parent)
 
@@ -118,17 +162,18 @@ class EpisodesScreen(Screen):
             return
         parent = self.sachi_parent
         screen = cast(RenameScreen, self.app.get_screen("rename"))
-        table = screen.query_one(DataTable)
-        j = 0
-        for row in table.ordered_rows:
-            if j >= len(self.selected_episodes):
+        table = screen.query_one(VirtualTable)
+        matched = []
+        for row_key in table.ordered_keys:
+            if len(matched) >= len(self.selected_episodes):
                 break
-            file = screen.files[row.key]
+            file = screen.files[row_key]
             if file.match is None:
                 file.match = SachiMatch(
-                    parent=parent, episode=self.selected_episodes[j]
+                    parent=parent, episode=self.selected_episodes[len(matched)]
                 )
-                j += 1
+                matched.append(file)
+        self.confirm_titles(matched)
         self.app.switch_screen("rename")
         self.deselect_all()
 
@@ -137,8 +182,25 @@ class EpisodesScreen(Screen):
             return
         parent = self.sachi_parent
         screen = cast(RenameScreen, self.app.get_screen("rename"))
-        table = screen.query_one(DataTable)
-        for row, ep in zip(table.ordered_rows, self.selected_episodes):
-            screen.files[row.key].match = SachiMatch(parent=parent, episode=ep)
+        table = screen.query_one(VirtualTable)
+        matched = []
+        for row_key, ep in zip(table.ordered_keys, self.selected_episodes):
+            file = screen.files[row_key]
+            file.match = SachiMatch(parent=parent, episode=ep)
+            matched.append(file)
+        self.confirm_titles(matched)
+        self.app.switch_screen("rename")
+        self.deselect_all()
+
+    def action_auto_match(self):
+        if self.sachi_parent is None:
+            return
+        screen = cast(RenameScreen, self.app.get_screen("rename"))
+        query = self.query_one("#search-input", Input).value
+        matched = auto_match(
+            screen.files.values(), self.sachi_parent, self.sachi_episodes, [query]
+        )
+        self.confirm_titles(matched)
+        self.notify(f"Matched {len(matched)} files to {self.sachi_parent.title}")
         self.app.switch_screen("rename")
         self.deselect_all()
@@ -1,15 +1,30 @@
-from contextlib import suppress
+import asyncio
+from collections import defaultdict
 from functools import partial
 from pathlib import Path
-from typing import Generator, Literal, assert_never
+from typing import Literal, assert_never
 
+from rich.text import Text
+from textual import work
 from textual.app import ComposeResult
 from textual.reactive import reactive
 from textual.screen import Screen
-from textual.widgets import DataTable, Footer, Header
-from textual.widgets.data_table import CellDoesNotExist, RowKey
+from textual.widgets import Footer, Header
 
+from sachi.analysis import Priority, get_media_analyzer
+from sachi.bindings import Provider
+from sachi.config import ConfigService, get_config, get_config_service
+from sachi.filename import get_filename_analyzer
+from sachi.journal import RenameJournal
+from sachi.matcher import auto_match
 from sachi.models import SachiFile
+from sachi.planner import plan_renames
+from sachi.renamer import RenameExecutor, RenameOp, RenameProgress
+from sachi.resolver import MIN_CONFIDENCE, get_title_cache
+from sachi.scanner import iter_batches
+from sachi.sources.base import MediaType, get_all_sources
+from sachi.templates import get_template_engine
+from sachi.widgets import VirtualTable
 
 
 class RenameScreen(Screen):
@@ -19,122 +34,293 @@ class RenameScreen(Screen):
         ("x", "remove_element", "Remove"),
         ("j", "move('down')", "Move Down"),
         ("k", "move('up')", "Move Up"),
+        ("m", "auto_match", "Auto Match"),
         ("p", "apply_renames", "Apply"),
+        ("escape", "cancel_renames", "Cancel"),
     ]
 
-    files: reactive[dict[RowKey, SachiFile]] = reactive({})
+    files: reactive[dict[int, SachiFile]] = reactive({})
 
-    def __init__(self, file_or_dir: Path, **kwargs):
+    def __init__(self, file_or_dir: Path, verify: bool | None = None, **kwargs):
         super().__init__(**kwargs)
         self.file_or_dir = file_or_dir
+        # None follows checksum.verify in the config, also across reloads
+        self.verify = verify
         self.base_dir = file_or_dir.parent if file_or_dir.is_file() else file_or_dir
 
+        self.renamed: list[int] = []
+        self.rename_errors: list[Exception] = []
+        self.rename_progress: RenameProgress | None = None
+        self._flush_pending = False
+
     def compose(self) -> ComposeResult:
         yield Header()
-        yield DataTable(zebra_stripes=True)
+        yield VirtualTable(zebra_stripes=True)
         yield Footer()
 
     # Methods
 
-    def iter_files(self, file_or_dir: Path) -> Generator[Path, None, None]:
-        if file_or_dir.name.startswith("."):
+    def add_files(self, paths: list[Path]):
+        table = self.query_one(VirtualTable)
+        from_key, to_key, check_key = self.col_keys
+        files = []
+        prefetch = self.prefetch and get_template_engine().needs(Provider.MEDIA)
+        row_keys = table.add_rows(
+            (str(path.relative_to(self.base_dir)), None, None) for path in paths
+        )
+        for path, row_key in zip(paths, row_keys):
+            self.files[row_key] = file = SachiFile(
+                path,
+                self.base_dir,
+                partial(table.update_cell, row_key, to_key, update_width=True),
+                partial(table.update_cell, row_key, check_key, update_width=True),
+            )
+            files.append(file)
+            if prefetch:
+                get_media_analyzer().submit(file, Priority.PREFETCH)
+        self.run_worker(self.analyze_files(files), group="guessit")
+        self.sub_title = f"{self.SUB_TITLE} (scanning, {len(self.files)} files)"
+        self.prioritize_visible()
+
+    def finish_scan(self):
+        table = self.query_one(VirtualTable)
+        table.sort(self.col_keys[0])
+        self.sub_title = self.SUB_TITLE
+        self.prioritize_visible()
+
+    def prioritize_visible(self):
+        # without prefetch, media analysis only starts once a file is matched
+        if not (self.prefetch and get_template_engine().needs(Provider.MEDIA)):
             return
-        if file_or_dir.is_file():
-            yield file_or_dir
-        elif file_or_dir.is_dir():
-            for file in file_or_dir.iterdir():
-                yield from self.iter_files(file)
+        table = self.query_one(VirtualTable)
+        get_media_analyzer().set_visible(
+            self.files[row_key] for row_key in table.visible_keys()
+        )
+
+    def remove_files(self, row_keys: list[int]):
+        table = self.query_one(VirtualTable)
+        table.remove_rows(row_keys)
+        for row_key in row_keys:
+            get_media_analyzer().discard(self.files.pop(row_key))
+
+    def on_renamed(self, op: RenameOp, error: Exception | None):
+        if error is None:
+            self.renamed.append(op.tag)
         else:
-            raise RuntimeError(f"Invalid file or directory: {file_or_dir}")
+            self.rename_errors.append(error)
+        if not self._flush_pending:
+            # apply everything finished within a frame in one table update
+            self._flush_pending = True
+            self.call_after_refresh(self.flush_renamed)
+
+    def flush_renamed(self):
+        self._flush_pending = False
+        renamed, self.renamed = self.renamed, []
+        self.remove_files(renamed)
+        if self.rename_progress is not None:
+            self.sub_title = (
+                f"{self.SUB_TITLE} (renaming {self.rename_progress}, esc to cancel)"
+            )
+        else:
+            self.sub_title = self.SUB_TITLE
+
+    # Workers
+
+    async def analyze_files(self, files: list[SachiFile]):
+        await get_filename_analyzer().analyze(files)
+        verify = self.verify
+        if verify is None:
+            verify = get_config().checksum.verify
+        if verify:
+            # only files named with a release CRC have something to verify
+            await asyncio.gather(
+                *(file.verify() for file in files if "crc32" in file.guess),
+                return_exceptions=True,
+            )
+
+    @work(thread=True, exclusive=True, group="scan")
+    def scan_files(self):
+        for batch in iter_batches(self.file_or_dir):
+            self.app.call_from_thread(self.add_files, batch)
+        self.app.call_from_thread(self.finish_scan)
 
     # Event handlers
 
     async def on_mount(self):
-        table = self.query_one(DataTable)
-        col_keys = table.add_columns("From", "To")
-        for path in self.iter_files(self.file_or_dir):
-            row_key = table.add_row(
-                str(path.relative_to(self.base_dir)),
-                None,
-            )
-            self.files[row_key] = SachiFile(
-                path,
-                self.base_dir,
-                partial(table.update_cell, row_key, col_keys[1], update_width=True),
-            )
-        table.sort(col_keys[0])
+        table = self.query_one(VirtualTable)
+        self.col_keys = table.add_columns("From", "To", "CRC")
+        self.prefetch = get_config().analysis.prefetch
+        self.unsubscribe_config = get_config_service().subscribe(self.on_config_change)
+        self.watch(table, "scroll_y", self.prioritize_visible, init=False)
         table.focus()
+        self.scan_files()
+
+    def on_unmount(self):
+        self.unsubscribe_config()
+
+    def on_config_change(self, service: ConfigService):
+        self.prefetch = service.model.analysis.prefetch
+        for file in self.files.values():
+            if file.match is not None:
+                file.refresh_new_path()
+
+    def on_resize(self):
+        self.prioritize_visible()
 
     # Key bindings
 
     def action_remove_element(self):
-        table = self.query_one(DataTable)
-        cell_key = table.coordinate_to_cell_key(table.cursor_coordinate)
+        table = self.query_one(VirtualTable)
+        row_key = table.cursor_key
+        if row_key is None:
+            return
         col_i = table.cursor_column
         match col_i:
-            case 0:
-                table.remove_row(cell_key.row_key)
-                del self.files[cell_key.row_key]
+            case 0 | 2:
+                self.remove_files([row_key])
             case 1:
-                self.files[cell_key.row_key].match = None
+                self.files[row_key].match = None
             case _:
                 raise RuntimeError(f"Invalid column: {col_i}")
 
     def action_move(self, direction: Literal["up", "down"]):
-        with suppress(CellDoesNotExist):
-            table = self.query_one(DataTable)
-
-            cood = table.cursor_coordinate
-            cell_key = table.coordinate_to_cell_key(cood)
-
-            match direction:
-                case "up":
-                    cood_other = cood.up()
-                case "down":
-                    cood_other = cood.down()
-                case _:
-                    assert_never(direction)
-            cell_other_key = table.coordinate_to_cell_key(cood_other)
-
-            col_i = table.cursor_column
-            file = self.files[cell_key.row_key]
-            file_other = self.files[cell_other_key.row_key]
-            if col_i == 0:
-                self.files[cell_key.row_key], self.files[cell_other_key.row_key] = (
-                    file_other,
-                    file,
-                )
-                file.set_rename_cell, file_other.set_rename_cell = (
-                    file_other.set_rename_cell,
-                    file.set_rename_cell,
-                )
-                table.update_cell_at(
-                    cood_other,
-                    str(file.path.relative_to(self.base_dir)),
-                )
-                table.update_cell_at(
-                    cood,
-                    str(file_other.path.relative_to(self.base_dir)),
-                )
-            file_other.match, file.match = file.match, file_other.match
-
-            match direction:
-                case "up":
-                    table.action_cursor_up()
-                case "down":
-                    table.action_cursor_down()
-                case _:
-                    assert_never(direction)
+        table = self.query_one(VirtualTable)
+        row = table.cursor_row
+        match direction:
+            case "up":
+                other = row - 1
+            case "down":
+                other = row + 1
+            case _:
+                assert_never(direction)
+        if not (0 <= row < table.row_count and 0 <= other < table.row_count):
+            return
 
+        file = self.files[table.ordered_keys[row]]
+        file_other = self.files[table.ordered_keys[other]]
+        if table.cursor_column == 0:
+            # the file moves and the matches stay where they are
+            table.swap_rows(row, other)
+        file_other.match, file.match = file.match, file_other.match
+        table.cursor_row = other
+
+    @work(exclusive=True, group="rename")
     async def action_apply_renames(self):
-        table = self.query_one(DataTable)
-        for row in table.ordered_rows:
-            file = self.files[row.key]
+        table = self.query_one(VirtualTable)
+        matched = [
+            (row_key, self.files[row_key])
+            for row_key in table.ordered_keys
+            if self.files[row_key].match is not None
+        ]
+        results = await asyncio.gather(
+            *(file.new_path for _, file in matched), return_exceptions=True
+        )
+        # files whose path failed already show why in their rename cell
+        resolved = [
+            (row_key, file, result)
+            for (row_key, file), result in zip(matched, results)
+            if not isinstance(result, BaseException)
+        ]
+        if failed := len(matched) - len(resolved):
+            self.notify(
+                f"Skipping {failed} files without a new name", severity="warning"
+            )
+        row_keys = {id(file): row_key for row_key, file, _ in resolved}
+        plan = await asyncio.to_thread(
+            plan_renames, ((file, new_path) for _, file, new_path in resolved)
+        )
+        ops = []
+        collisions = 0
+        for planned in plan:
+            file = planned.file
+            if planned.collision is not None:
+                collisions += 1
+                file.set_rename_cell(Text(planned.collision, style="red"))
+            elif planned.dst != file.path:
+                file.set_rename_cell(str(planned.dst.relative_to(file.base_dir)))
+                ops.append(RenameOp(file.path, planned.dst, row_keys[id(file)]))
+        if collisions:
+            self.notify(
+                f"Skipping {collisions} files with conflicting destinations",
+                severity="warning",
+            )
+        if not ops:
+            return
 
-            if file.match is not None:
-                new_path = await file.new_path
-                new_path.parent.mkdir(parents=True, exist_ok=True)
-                file.path.rename(new_path)
+        journal = RenameJournal.create()
+        ids = await asyncio.to_thread(journal.plan, ((op.src, op.dst) for op in ops))
+        for op, journal_id in zip(ops, ids):
+            op.journal_id = journal_id
+        executor = RenameExecutor(
+            ops,
+            get_config().pipeline.rename_workers,
+            self.on_renamed,
+            journal,
+        )
+        self.rename_progress = executor.progress
+        self.rename_errors = []
+        self.flush_renamed()
+        try:
+            progress = await executor.run()
+            journal.finish()
+        except asyncio.CancelledError:
+            self.notify("Renaming cancelled", severity="warning")
+            raise
+        finally:
+            journal.close()
+            self.rename_progress = None
+            self.flush_renamed()
+        if self.rename_errors:
+            self.notify(
+                f"{progress.failed} of {progress.total} renames failed: "
+                f"{self.rename_errors[0]}",
+                severity="error",
+            )
+        else:
+            self.notify(f"Renamed {progress.done} files")
+
+    def action_cancel_renames(self):
+        self.workers.cancel_group(self, "rename")
+
+    @work(exclusive=True, group="match")
+    async def action_auto_match(self):
+        from sachi.screens.episodes import ParentSelectionModal
+
+        source_cls = next(
+            s for s in get_all_sources() if s.media_type == MediaType.SERIES
+        )
+        source = source_cls.get_instance()
+        title_cache = get_title_cache()
+
+        by_title: defaultdict[tuple, list[SachiFile]] = defaultdict(list)
+        for file in self.files.values():
+            title = file.guess.get("title")
+            if file.match is None and title and file.guess.get("type") == "episode":
+                by_title[(title, file.guess.get("year"))].append(file)
 
-                table.remove_row(row.key)
-                del self.files[row.key]
+        matched = cached = 0
+        for (title, year), files in by_title.items():
+            resolution = title_cache.resolve(source.service, title, year)
+            if resolution is not None and resolution.exact:
+                parent = resolution.parent
+                cached += len(files)
+            else:
+                # only titles we have never confirmed go to the network
+                parents = await source.search(title)
+                if resolution is not None and resolution.confidence >= MIN_CONFIDENCE:
+                    # a similar title can be another series, so offer it first
+                    candidate = resolution.parent
+                    self.notify(
+                        f'"{title}" resembles {candidate.title} ({candidate.year}), '
+                        f"{resolution.confidence:.0%} confident"
+                    )
+                    parents = [candidate] + [
+                        p for p in parents if p.ref_id != candidate.ref_id
+                    ]
+                if not parents:
+                    continue
+                parent = await self.app.push_screen_wait(ParentSelectionModal(parents))
+                title_cache.confirm(source.service, title, year, parent)
+            episodes = await source.get_episodes(parent)
+            matched += len(auto_match(files, parent, episodes, [title]))
+        self.notify(f"Matched {matched} files, {cached} from known titles")
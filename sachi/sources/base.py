@@ -1,9 +1,17 @@
+import asyncio
+import functools
+import json
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import StrEnum
-from typing import Self
+from typing import Any, Awaitable, Callable, Coroutine, Self
 
 import aiohttp
+from yarl import URL
+
+from sachi.sources.cache import CacheMode, OfflineCacheMiss, get_response_cache
+from sachi.sources.http import get_session_manager
+from sachi.sources.limiter import get_rate_limiter
 
 
 class MediaType(StrEnum):
@@ -27,18 +35,97 @@ class SachiEpisodeModel[RefIdType]:
     name: str | None = None
 
 
+@dataclass
+class CoalesceStats:
+    calls: int = 0
+    coalesced: int = 0
+
+
+type SourceCall = Callable[..., Coroutine[Any, Any, list]]
+
+_inflight: dict[tuple, asyncio.Future[list]] = {}
+
+
+def _finish(key: tuple, fut: asyncio.Future[list]):
+    _inflight.pop(key, None)
+    # when every caller gave up, nobody else retrieves the exception
+    if not fut.cancelled():
+        fut.exception()
+
+
+def single_flight(op: str, func: SourceCall) -> SourceCall:
+    @functools.wraps(func)
+    async def wrapper(self: "SachiSource", *args, **kwargs) -> list:
+        key = (self.service, op, repr(args), repr(sorted(kwargs.items())))
+        self.coalesce_stats.calls += 1
+        fut = _inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(func(self, *args, **kwargs))
+            _inflight[key] = fut
+            fut.add_done_callback(functools.partial(_finish, key))
+        else:
+            self.coalesce_stats.coalesced += 1
+        # one caller giving up must not cancel the request for the others
+        return list(await asyncio.shield(fut))
+
+    return wrapper
+
+
 class SachiSource[RefIdType](ABC):
     media_type: MediaType
     service: str
+    coalesce_stats: CoalesceStats
 
-    _session: aiohttp.ClientSession | None = None
     _instance: Self | None = None
 
     @property
     def session(self) -> aiohttp.ClientSession:
-        if self._session is None:
-            self._session = aiohttp.ClientSession(raise_for_status=True)
-        return self._session
+        return get_session_manager().session
+
+    async def get_json(
+        self,
+        url: URL,
+        *,
+        ttl: float,
+        params: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        auth: Callable[[], Awaitable[dict[str, str]]] | None = None,
+    ) -> Any:
+        cache = get_response_cache()
+        key = f"{self.service} GET {url.update_query(params or {})}"
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None and (
+            cache.mode == CacheMode.OFFLINE
+            or (cache.mode == CacheMode.DEFAULT and cached.fresh)
+        ):
+            cache.hits += 1
+            return cached.json()
+        if cache.mode == CacheMode.OFFLINE:
+            raise OfflineCacheMiss(key)
+
+        headers = dict(headers or {})
+        if auth is not None:
+            # only requests that reach the network need credentials
+            headers |= await auth()
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        async with (
+            get_rate_limiter(self.service).request(),
+            self.session.get(url, params=params, headers=headers) as resp,
+        ):
+            if resp.status == 304 and cached is not None:
+                cache.revalidated += 1
+                await asyncio.to_thread(cache.extend, key, ttl)
+                return cached.json()
+            body = await resp.read()
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+        cache.misses += 1
+        await asyncio.to_thread(cache.put, key, body, etag, last_modified, ttl)
+        return json.loads(body)
 
     @abstractmethod
     async def search(self, query: str) -> list[SachiParentModel[RefIdType]]:
@@ -60,13 +147,19 @@ class SachiSource[RefIdType](ABC):
         super().__init_subclass__(**kwargs)
         cls.media_type = media_type
         cls.service = service
+        cls.coalesce_stats = CoalesceStats()
+        for op in ("search", "get_episodes"):
+            if op in cls.__dict__:
+                setattr(cls, op, single_flight(op, cls.__dict__[op]))
 
 
 def get_all_sources() -> list[type[SachiSource]]:
     from sachi.sources.custom import CustomMovieSource
+    from sachi.sources.local import LocalIndexSource
     from sachi.sources.tvdb import TVDBSource
 
     return [
         TVDBSource,
         CustomMovieSource,
+        LocalIndexSource,
     ]
@@ -0,0 +1,160 @@
+import json
+import time
+from dataclasses import dataclass
+from enum import StrEnum
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+from sachi.config import get_app_dir, get_config
+from sachi.store import SqliteStore
+
+
+class CacheMode(StrEnum):
+    DEFAULT = "default"
+    REFRESH = "refresh"
+    OFFLINE = "offline"
+
+
+class OfflineCacheMiss(Exception):
+    pass
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    expires: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+@dataclass
+class ResponseCacheStats:
+    entries: int
+    fresh: int
+    data_bytes: int
+    file_bytes: int
+
+
+class ResponseCache(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        body BLOB NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        expires REAL NOT NULL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+    """
+
+    def __init__(self, path: Path, max_bytes: int, mode: CacheMode = CacheMode.DEFAULT):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def get(self, key: str) -> CachedResponse | None:
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT body, etag, last_modified, expires FROM responses "
+                "WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+        return CachedResponse(*row)
+
+    def put(
+        self,
+        key: str,
+        body: bytes,
+        etag: str | None,
+        last_modified: str | None,
+        ttl: float,
+    ):
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, body, etag, last_modified, now + ttl, now, len(body)),
+            )
+            self._evict(conn)
+
+    def extend(self, key: str, ttl: float):
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE responses SET expires = ?, accessed = ? WHERE key = ?",
+                (now + ttl, now, key),
+            )
+
+    def scan(self, prefix: str) -> list[tuple[str, bytes]]:
+        with self.transaction() as conn:
+            return conn.execute(
+                "SELECT key, body FROM responses WHERE substr(key, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+
+    def stats(self) -> ResponseCacheStats:
+        with self.transaction() as conn:
+            entries, fresh, data_bytes = conn.execute(
+                "SELECT count(*), coalesce(sum(expires > ?), 0), "
+                "coalesce(sum(size), 0) FROM responses",
+                (time.time(),),
+            ).fetchone()
+        return ResponseCacheStats(entries, fresh, data_bytes, self.size_on_disk())
+
+    def prune(self, older_than: float | None = None, clear: bool = False) -> int:
+        with self.transaction() as conn:
+            if clear:
+                removed = conn.execute("DELETE FROM responses").rowcount
+            elif older_than is not None:
+                removed = conn.execute(
+                    "DELETE FROM responses WHERE accessed < ?", (older_than,)
+                ).rowcount
+            else:
+                removed = self._evict(conn)
+        if removed:
+            self.vacuum()
+        return removed
+
+    def _evict(self, conn) -> int:
+        (total,) = conn.execute(
+            "SELECT coalesce(sum(size), 0) FROM responses"
+        ).fetchone()
+        removed = 0
+        if total <= self.max_bytes:
+            return removed
+        # drop least recently used responses until back under the limit
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed"
+        ).fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            removed += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+        return removed
+
+
+@cache
+def get_response_cache() -> ResponseCache:
+    conf = get_config().http_cache
+    return ResponseCache(
+        get_app_dir() / "http.sqlite", max_bytes=conf.max_size_mb * 1024 * 1024
+    )
@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+from functools import cache
+
+import aiohttp
+
+from sachi.config import get_config
+
+
+@dataclass
+class ConnectionStats:
+    requests: int = 0
+    created: int = 0
+    reused: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.requests} requests over {self.created} connections "
+            f"({self.reused} reused)"
+        )
+
+
+class SessionManager:
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 8,
+        dns_ttl: int = 300,
+        keepalive_timeout: float = 30,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.stats = ConnectionStats()
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                raise_for_status=True,
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        async def on_request_start(session, ctx, params):
+            self.stats.requests += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.stats.created += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.stats.reused += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+
+@cache
+def get_session_manager() -> SessionManager:
+    conf = get_config().http
+    return SessionManager(
+        conf.limit, conf.limit_per_host, conf.dns_ttl, conf.keepalive_timeout
+    )
@@ -0,0 +1,186 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Mapping
+
+import aiohttp
+
+from sachi.config import get_config
+
+THROTTLE_STATUSES = frozenset({429, 503})
+MIN_RATE = 0.5
+
+
+@dataclass
+class LimiterStats:
+    rate: float
+    concurrency: int
+    in_flight: int
+    waiting: int
+    throttled: int
+    errors: int
+
+    def __str__(self) -> str:
+        return (
+            f"{self.rate:.1f} req/s, {self.in_flight}/{self.concurrency} in flight, "
+            f"{self.waiting} queued, {self.throttled} throttled, {self.errors} errors"
+        )
+
+
+def retry_after(headers: Mapping[str, str] | None) -> float | None:
+    value = headers.get("Retry-After") if headers else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rate: float = 5,
+        max_rate: float = 50,
+        concurrency: int = 4,
+        max_concurrency: int = 16,
+        latency_target: float = 1.0,
+    ):
+        self.rate = max(MIN_RATE, min(rate, max_rate))
+        self.max_rate = max_rate
+        self.concurrency = float(max(1, min(concurrency, max_concurrency)))
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.waiting = 0
+        self.throttled = 0
+        self.errors = 0
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._cond = asyncio.Condition()
+
+    @property
+    def stats(self) -> LimiterStats:
+        return LimiterStats(
+            self.rate,
+            int(self.concurrency),
+            self.in_flight,
+            self.waiting,
+            self.throttled,
+            self.errors,
+        )
+
+    @asynccontextmanager
+    async def request(self) -> AsyncIterator[None]:
+        await self._acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except aiohttp.ClientResponseError as e:
+            throttled = e.status in THROTTLE_STATUSES
+            await self._release(
+                time.monotonic() - started,
+                ok=not throttled and e.status < 500,
+                delay=retry_after(e.headers) if throttled else None,
+                throttled=throttled,
+            )
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            await self._release(time.monotonic() - started, ok=False)
+            raise
+        except BaseException:
+            await self._release(None, ok=True)
+            raise
+        else:
+            await self._release(time.monotonic() - started, ok=True)
+
+    def _refill(self, now: float):
+        # allow a burst of up to one second's worth of requests
+        self.tokens = min(
+            max(1.0, self.rate), self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def _acquire(self):
+        self.waiting += 1
+        try:
+            async with self._cond:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now < self.blocked_until:
+                        timeout = self.blocked_until - now
+                    elif self.tokens < 1:
+                        timeout = (1 - self.tokens) / self.rate
+                    elif self.in_flight >= int(self.concurrency):
+                        timeout = None
+                    else:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        return
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout)
+                    except TimeoutError:
+                        pass
+        finally:
+            self.waiting -= 1
+
+    async def _release(
+        self,
+        latency: float | None,
+        ok: bool,
+        delay: float | None = None,
+        throttled: bool = False,
+    ):
+        async with self._cond:
+            self.in_flight -= 1
+            if not ok:
+                # multiplicative decrease on errors and throttling
+                if throttled:
+                    self.throttled += 1
+                else:
+                    self.errors += 1
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self.rate = max(MIN_RATE, self.rate / 2)
+                if delay is not None:
+                    self.blocked_until = max(
+                        self.blocked_until, time.monotonic() + delay
+                    )
+            elif latency is not None and latency > self.latency_target:
+                self.concurrency = max(1.0, self.concurrency * 0.9)
+            elif latency is not None:
+                # additive increase, about one step per round of requests
+                self.concurrency = min(
+                    float(self.max_concurrency),
+                    self.concurrency + 1 / self.concurrency,
+                )
+                self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+            self._cond.notify_all()
+
+
+_limiters: dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(service: str) -> RateLimiter:
+    if service not in _limiters:
+        conf = get_config().rate_limit
+        _limiters[service] = RateLimiter(
+            conf.rate,
+            conf.max_rate,
+            conf.concurrency,
+            conf.max_concurrency,
+            conf.latency_target,
+        )
+    return _limiters[service]
+
+
+def get_rate_limiters() -> dict[str, RateLimiter]:
+    return dict(_limiters)
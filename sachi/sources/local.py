@@ -0,0 +1,283 @@
+import json
+import re
+import sqlite3
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from typing import Any, Iterable
+
+from pydantic import TypeAdapter, ValidationError
+
+from sachi.config import get_app_dir
+from sachi.sources.base import (
+    MediaType,
+    SachiEpisodeModel,
+    SachiParentModel,
+    SachiSource,
+)
+from sachi.sources.cache import ResponseCache
+from sachi.sources.tvdb import EpisodeModel, SearchModel, TVDBSource
+from sachi.store import SqliteStore
+
+SEARCH_LIMIT = 20
+WORD_RE = re.compile(r"\w+")
+EPISODES_URL_RE = re.compile(r"/series/(?P<id>\d+)/episodes/")
+EPISODES_ADAPTER = TypeAdapter(list[EpisodeModel])
+
+
+@dataclass
+class IndexStats:
+    series: int
+    titles: int
+    episodes: int
+    file_bytes: int
+
+
+def fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+class SeriesIndex(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS series (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        year INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS titles (
+        id INTEGER PRIMARY KEY,
+        series_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        UNIQUE (series_id, title)
+    );
+    CREATE TABLE IF NOT EXISTS episodes (
+        id INTEGER PRIMARY KEY,
+        series_id INTEGER NOT NULL,
+        season INTEGER NOT NULL,
+        episode INTEGER NOT NULL,
+        name TEXT
+    );
+    CREATE INDEX IF NOT EXISTS episodes_series
+        ON episodes (series_id, season, episode);
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS titles_words USING fts5(
+        title, content='titles', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS titles_trigrams USING fts5(
+        title, content='titles', content_rowid='id', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS titles_insert AFTER INSERT ON titles BEGIN
+        INSERT INTO titles_words (rowid, title) VALUES (new.id, new.title);
+        INSERT INTO titles_trigrams (rowid, title) VALUES (new.id, new.title);
+    END;
+    CREATE TRIGGER IF NOT EXISTS titles_delete AFTER DELETE ON titles BEGIN
+        INSERT INTO titles_words (titles_words, rowid, title)
+            VALUES ('delete', old.id, old.title);
+        INSERT INTO titles_trigrams (titles_trigrams, rowid, title)
+            VALUES ('delete', old.id, old.title);
+    END;
+    """
+
+    def add_series(
+        self,
+        series_id: int,
+        title: str,
+        year: int | None,
+        aliases: Iterable[str],
+        replace: bool = True,
+    ):
+        with self.transaction() as conn:
+            _insert_series(conn, series_id, title, year, aliases, replace)
+
+    def add_episodes(self, series_id: int, episodes: Iterable[SachiEpisodeModel]):
+        with self.transaction() as conn:
+            _insert_episodes(conn, series_id, episodes)
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list[tuple]:
+        words = WORD_RE.findall(query.lower())
+        if not words:
+            return []
+        # every word as a prefix first, then fall back to shared trigrams
+        rows = self._match(
+            "titles_words", " ".join(fts_phrase(w) + "*" for w in words), limit
+        )
+        if rows:
+            return rows
+        text = " ".join(words)
+        trigrams = {text[i : i + 3] for i in range(len(text) - 2)}
+        if not trigrams:
+            return []
+        return self._match(
+            "titles_trigrams", " OR ".join(map(fts_phrase, trigrams)), limit
+        )
+
+    def episodes(self, series_id: int) -> list[tuple]:
+        with self.transaction() as conn:
+            return conn.execute(
+                "SELECT id, season, episode, name FROM episodes "
+                "WHERE series_id = ? ORDER BY season, episode",
+                (series_id,),
+            ).fetchall()
+
+    def stats(self) -> IndexStats:
+        with self.transaction() as conn:
+            series, titles, episodes = (
+                conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                for table in ("series", "titles", "episodes")
+            )
+        return IndexStats(series, titles, episodes, self.size_on_disk())
+
+    def clear(self):
+        with self.transaction() as conn:
+            for table in ("series", "titles", "episodes"):
+                conn.execute(f"DELETE FROM {table}")
+        self.vacuum()
+
+    def _match(self, table: str, expr: str, limit: int) -> list[tuple]:
+        with self.transaction() as conn:
+            return conn.execute(
+                "SELECT s.id, s.title, s.year, min(f.rank) AS score FROM "
+                f"(SELECT rowid, rank FROM {table} WHERE {table} MATCH ? "
+                "ORDER BY rank LIMIT ?) f "
+                "JOIN titles t ON t.id = f.rowid "
+                "JOIN series s ON s.id = t.series_id "
+                "GROUP BY s.id ORDER BY score LIMIT ?",
+                # several titles can point at the same series
+                (expr, limit * 4, limit),
+            ).fetchall()
+
+    def import_dump(self, path: Path) -> tuple[int, int]:
+        series_count = episode_count = 0
+        with path.open() as f, self.transaction() as conn:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                _insert_series(
+                    conn,
+                    record["id"],
+                    record["name"],
+                    record.get("year"),
+                    record.get("aliases", []),
+                )
+                episodes = _to_episodes(record.get("episodes", []))
+                _insert_episodes(conn, record["id"], episodes)
+                series_count += 1
+                episode_count += len(episodes)
+        return series_count, episode_count
+
+    def import_tvdb_cache(self, cache: ResponseCache) -> tuple[int, int]:
+        series_ids: set[int] = set()
+        episode_count = 0
+        prefix = f"{TVDBSource.service} GET {TVDBSource.server}"
+        for key, body in cache.scan(prefix):
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                continue
+            # skip anything that is not a TVDB response envelope
+            data = payload.get("data") if isinstance(payload, dict) else None
+            if "/search?" in key:
+                try:
+                    results = TypeAdapter(list[SearchModel]).validate_python(data)
+                except ValidationError:
+                    continue
+                for sr in results:
+                    self.add_series(
+                        sr.tvdb_id,
+                        sr.translations.get("eng", sr.name),
+                        sr.year,
+                        [sr.name],
+                    )
+                    series_ids.add(sr.tvdb_id)
+            elif (url_match := EPISODES_URL_RE.search(key)) is not None:
+                if not isinstance(data, dict):
+                    continue
+                series_id = int(url_match["id"])
+                series = data.get("series") or {}
+                if series.get("name"):
+                    year = series.get("year")
+                    aliases = [
+                        alias["name"] if isinstance(alias, dict) else alias
+                        for alias in series.get("aliases") or []
+                    ]
+                    # search results carry the English title, keep it if known
+                    self.add_series(
+                        series_id,
+                        series["name"],
+                        int(year) if year else None,
+                        aliases,
+                        replace=False,
+                    )
+                    series_ids.add(series_id)
+                episodes = _to_episodes(data.get("episodes") or [])
+                self.add_episodes(series_id, episodes)
+                episode_count += len(episodes)
+        return len(series_ids), episode_count
+
+
+def _insert_series(
+    conn: sqlite3.Connection,
+    series_id: int,
+    title: str,
+    year: int | None,
+    aliases: Iterable[str],
+    replace: bool = True,
+):
+    conn.execute(
+        f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO series VALUES (?, ?, ?)",
+        (series_id, title, year),
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO titles (series_id, title) VALUES (?, ?)",
+        [(series_id, t) for t in {title, *aliases} if t],
+    )
+
+
+def _insert_episodes(
+    conn: sqlite3.Connection, series_id: int, episodes: Iterable[SachiEpisodeModel]
+):
+    conn.executemany(
+        "INSERT OR REPLACE INTO episodes VALUES (?, ?, ?, ?, ?)",
+        [(ep.ref_id, series_id, ep.season, ep.episode, ep.name) for ep in episodes],
+    )
+
+
+def _to_episodes(records: list[dict[str, Any]]) -> list[SachiEpisodeModel[int]]:
+    return [
+        SachiEpisodeModel[int](
+            ref_id=ep.id, season=ep.seasonNumber, episode=ep.number, name=ep.name
+        )
+        for ep in EPISODES_ADAPTER.validate_python(records)
+    ]
+
+
+@cache
+def get_series_index() -> SeriesIndex:
+    return SeriesIndex(get_app_dir() / "index.sqlite")
+
+
+class LocalIndexSource(
+    SachiSource[int], media_type=MediaType.SERIES, service="Local index"
+):
+    async def search(self, query: str) -> list[SachiParentModel[int]]:
+        # sqlite answers well under a millisecond, so no thread hop
+        return [
+            SachiParentModel(
+                media_type=self.media_type, ref_id=series_id, title=title, year=year
+            )
+            for series_id, title, year, _ in get_series_index().search(query)
+        ]
+
+    async def get_episodes(
+        self, parent: SachiParentModel[int]
+    ) -> list[SachiEpisodeModel[int]]:
+        return [
+            SachiEpisodeModel[int](
+                ref_id=ep_id, season=season, episode=episode, name=name
+            )
+            for ep_id, season, episode, name in get_series_index().episodes(
+                parent.ref_id
+            )
+        ]
@@ -1,16 +1,28 @@
+import asyncio
+import base64
+import json
+import math
+import time
+from pathlib import Path
+
 import aiohttp
 import backoff
-import tomlkit
 from pydantic import BaseModel, TypeAdapter
 from yarl import URL
 
-from sachi.config import read_config, write_config
+from sachi.config import (
+    ConfigService,
+    get_app_dir,
+    get_config,
+    get_config_service,
+)
 from sachi.sources.base import (
     MediaType,
     SachiEpisodeModel,
     SachiParentModel,
     SachiSource,
 )
+from sachi.sources.limiter import get_rate_limiter
 
 
 class ConfigModel(BaseModel):
@@ -40,9 +52,31 @@ class EpisodeModel(BaseModel):
     name: str | None = None
 
 
+class LinksModel(BaseModel):
+    next: str | None = None
+    total_items: int | None = None
+    page_size: int | None = None
+
+
+PAGE_CONCURRENCY = 4
+TOKEN_REFRESH_MARGIN = 24 * 60 * 60
+
+
+def token_expiry(token: str) -> float:
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        # not a JWT we understand, so let the API tell us when it stops working
+        return float("inf")
+
+
 def giveup(e: Exception):
     assert isinstance(e, aiohttp.ClientResponseError)
-    return e.status != 401
+    return e.status not in (401, 429)
 
 
 class TVDBSource(SachiSource[int], media_type=MediaType.SERIES, service="TheTVDB"):
@@ -50,42 +84,92 @@ class TVDBSource(SachiSource[int], media_type=MediaType.SERIES, service="TheTVDB
 
     def __init__(self):
         super().__init__()
-        self.config: TVDBConfigModel = self._load_config()
+        service = get_config_service()
+        self.config: TVDBConfigModel = self._load_config(service)
+        service.subscribe(self._on_config_change)
+
+        self.token_path: Path = get_app_dir() / "tvdb_token.json"
+        self.token: str | None = self._load_token() or self.config.token
+        self._login_lock = asyncio.Lock()
 
-    def _load_config(self) -> TVDBConfigModel:
-        config_doc = read_config()
-        model = ConfigModel(**config_doc.unwrap())
+    def _load_config(self, service: ConfigService) -> TVDBConfigModel:
+        model = ConfigModel(**service.data)
         return model.tvdb
 
-    def _save_config(self):
-        config_doc = read_config()
-        table = tomlkit.table()
-        table.update(self.config.model_dump())
-        config_doc["tvdb"] = table
-        write_config(config_doc)
+    def _on_config_change(self, service: ConfigService):
+        self.config = self._load_config(service)
+
+    def _load_token(self) -> str | None:
+        try:
+            return json.loads(self.token_path.read_text())["token"]
+        except (OSError, KeyError, TypeError, ValueError):
+            return None
+
+    def _save_token(self, token: str):
+        tmp_path = self.token_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(dict(token=token)))
+        tmp_path.replace(self.token_path)
 
-    async def _login(self, *args, **kwargs):
+    def _token_valid(self) -> bool:
+        return (
+            self.token is not None
+            and token_expiry(self.token) - TOKEN_REFRESH_MARGIN > time.time()
+        )
+
+    async def _get_token(self) -> str:
+        if self._token_valid():
+            assert self.token is not None
+            return self.token
+        async with self._login_lock:
+            # another caller may have logged in while we waited
+            if not self._token_valid():
+                await self._login()
+        assert self.token is not None
+        return self.token
+
+    def _invalidate_token(self, token: str):
+        if self.token == token:
+            self.token = None
+
+    async def _authorized_json(self, url: URL, **kwargs):
+        tokens: list[str] = []
+
+        # cache hits and offline runs never log in
+        async def auth() -> dict[str, str]:
+            tokens.append(await self._get_token())
+            return dict(Authorization=f"Bearer {tokens[-1]}")
+
+        try:
+            return await self.get_json(url, auth=auth, **kwargs)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 401 and tokens:
+                self._invalidate_token(tokens[-1])
+            raise
+
+    async def _login(self):
         body = dict(apiKey=self.config.apiKey)
-        async with self.session.post(self.server / "login", json=body) as resp:
+        async with (
+            get_rate_limiter(self.service).request(),
+            self.session.post(self.server / "login", json=body) as resp,
+        ):
             json = await resp.json()
         model = LoginModel(**json["data"])
-        self.config.token = model.token
-        self._save_config()
+        self.token = model.token
+        await asyncio.to_thread(self._save_token, model.token)
 
     async def search(self, query: str) -> list[SachiParentModel[int]]:
         @backoff.on_exception(
             backoff.expo,
             aiohttp.ClientResponseError,
             giveup=giveup,
-            on_backoff=self._login,
+            max_tries=3,
         )
         async def _search():
-            async with self.session.get(
+            json = await self._authorized_json(
                 self.server / "search",
                 params=dict(query=query, type="series"),
-                headers=dict(Authorization=f"Bearer {self.config.token}"),
-            ) as resp:
-                json = await resp.json()
+                ttl=get_config().http_cache.search_ttl,
+            )
             return TypeAdapter(list[SearchModel]).validate_python(json["data"])
 
         search_res = await _search()
@@ -106,24 +190,48 @@ class TVDBSource(SachiSource[int], media_type=MediaType.SERIES, service="TheTVDB
             backoff.expo,
             aiohttp.ClientResponseError,
             giveup=giveup,
-            on_backoff=lambda _: self._login(),
+            max_tries=3,
         )
-        async def _episodes():
-            async with self.session.get(
+        async def _episodes(page: int):
+            json = await self._authorized_json(
                 self.server
                 / "series"
                 / str(parent.ref_id)
                 / "episodes"
                 / "default"
                 / "eng",
-                headers=dict(Authorization=f"Bearer {self.config.token}"),
-            ) as resp:
-                json = await resp.json()
-            return TypeAdapter(list[EpisodeModel]).validate_python(
+                params=dict(page=str(page)),
+                ttl=get_config().http_cache.episodes_ttl,
+            )
+            episodes = TypeAdapter(list[EpisodeModel]).validate_python(
                 json["data"]["episodes"]
             )
+            return episodes, LinksModel(**(json.get("links") or {}))
+
+        episodes_res, links = await _episodes(0)
+        if links.total_items and links.page_size:
+            # the first page tells us how many there are, fetch the rest at once
+            pages = math.ceil(links.total_items / links.page_size)
+            semaphore = asyncio.Semaphore(PAGE_CONCURRENCY)
+
+            async def _page(page: int):
+                async with semaphore:
+                    page_episodes, _ = await _episodes(page)
+                return page_episodes
+
+            for page_episodes in await asyncio.gather(
+                *(_page(page) for page in range(1, pages))
+            ):
+                episodes_res.extend(page_episodes)
+        else:
+            page = 0
+            while links.next:
+                page += 1
+                page_episodes, links = await _episodes(page)
+                if not page_episodes:
+                    break
+                episodes_res.extend(page_episodes)
 
-        episodes_res = await _episodes()
         return [
             SachiEpisodeModel[int](
                 ref_id=ep.id,
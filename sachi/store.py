@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Generator
+
+
+@dataclass(frozen=True)
+class FileKey:
+    dev: int
+    ino: int
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def from_stat(cls, st: os.stat_result) -> "FileKey":
+        return cls(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    @classmethod
+    def from_path(cls, path: Path) -> "FileKey":
+        return cls.from_stat(path.stat())
+
+    def matches(self, path: Path) -> bool:
+        try:
+            return FileKey.from_path(path) == self
+        except OSError:
+            return False
+
+
+class SqliteStore:
+    SCHEMA: str = ""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    @contextmanager
+    def transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        with self._lock, self.conn as conn:
+            yield conn
+
+    def vacuum(self):
+        with self._lock:
+            self.conn.execute("VACUUM")
+
+    def size_on_disk(self) -> int:
+        return sum(
+            p.stat().st_size
+            for p in (self.path, self.path.with_name(self.path.name + "-wal"))
+            if p.exists()
+        )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class FileStore(SqliteStore):
+    # FILE_TABLE has dev, ino, size, mtime_ns, path and accessed columns, and
+    # its rows go stale once the file changes
+    FILE_TABLE: str = ""
+
+    def select_file(
+        self, conn: sqlite3.Connection, columns: str, key: FileKey, path: Path | None
+    ) -> list[Any]:
+        rows = conn.execute(
+            f"SELECT {columns} FROM {self.FILE_TABLE} "
+            "WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+            (key.dev, key.ino, key.size, key.mtime_ns),
+        ).fetchall()
+        if rows:
+            # renaming keeps the inode, so keep the recorded path current for
+            # prune not to drop renamed files
+            conn.execute(
+                f"UPDATE {self.FILE_TABLE} SET accessed = ?, path = coalesce(?, path) "
+                "WHERE dev = ? AND ino = ?",
+                (time.time(), path and os.fspath(path), key.dev, key.ino),
+            )
+        return rows
+
+    def prune(self, older_than: float | None = None, clear: bool = False) -> int:
+        with self.transaction() as conn:
+            rows = conn.execute(
+                "SELECT dev, ino, size, mtime_ns, path, max(accessed) "
+                f"FROM {self.FILE_TABLE} GROUP BY dev, ino"
+            ).fetchall()
+            stale = [
+                (dev, ino)
+                for dev, ino, size, mtime_ns, path, accessed in rows
+                if clear
+                or (older_than is not None and accessed < older_than)
+                or not FileKey(dev, ino, size, mtime_ns).matches(Path(path))
+            ]
+            conn.executemany(
+                f"DELETE FROM {self.FILE_TABLE} WHERE dev = ? AND ino = ?", stale
+            )
+        if stale:
+            self.vacuum()
+        return len(stale)
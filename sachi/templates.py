@@ -0,0 +1,124 @@
+import re
+from functools import cache
+from pathlib import Path
+from typing import Any, Mapping
+
+import jinja2
+import jinja2.meta
+
+from sachi.bindings import Provider, required_providers
+from sachi.config import BaseConfig, get_app_dir, get_config_service
+from sachi.sources.base import MediaType
+
+FS_SPECIAL_CHARS = re.compile(r"[/\\:*\"?<>|]")
+
+
+def sanitize(value: Any) -> str:
+    return FS_SPECIAL_CHARS.sub("", str(value))
+
+
+def pad(value: Any, width: int = 2) -> str:
+    if value is None:
+        return ""
+    try:
+        return f"{int(value):0{width}d}"
+    except (TypeError, ValueError):
+        return str(value).zfill(width)
+
+
+class TemplateEngine:
+    def __init__(self, bytecode_cache_dir: Path | None = None):
+        bytecode_cache = None
+        if bytecode_cache_dir is not None:
+            bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(str(bytecode_cache_dir))
+        self.env = jinja2.Environment(bytecode_cache=bytecode_cache)
+        self.env.filters["pad"] = pad
+        self.env.filters["sanitize"] = sanitize
+
+        self.revision = 0
+        self._sources: dict[MediaType, list[str]] = {}
+        self._templates: dict[MediaType, list[jinja2.Template]] = {}
+        self._variables: dict[MediaType, frozenset[str]] = {}
+        self._providers: dict[MediaType, frozenset[Provider]] = {}
+
+    def load(self, config_model: BaseConfig):
+        sources = {
+            MediaType.SERIES: config_model.series.template,
+            MediaType.MOVIE: config_model.movie.template,
+        }
+        if sources == self._sources:
+            return
+        # a DictLoader gives every segment a stable name for the bytecode cache
+        self.env.loader = jinja2.DictLoader(
+            {
+                f"{media_type}/{i}": part
+                for media_type, parts in sources.items()
+                for i, part in enumerate(parts)
+            }
+        )
+        self._templates = {
+            media_type: [
+                self.env.get_template(f"{media_type}/{i}") for i in range(len(parts))
+            ]
+            for media_type, parts in sources.items()
+        }
+        self._variables = {
+            media_type: frozenset().union(
+                *(
+                    jinja2.meta.find_undeclared_variables(self.env.parse(part))
+                    for part in parts
+                )
+            )
+            for media_type, parts in sources.items()
+        }
+        self._providers = {
+            media_type: required_providers(variables)
+            for media_type, variables in self._variables.items()
+        }
+        self._sources = sources
+        self.revision += 1
+
+    def templates(self, media_type: MediaType) -> list[jinja2.Template]:
+        return self._templates[media_type]
+
+    def variables(self, media_type: MediaType) -> frozenset[str]:
+        return self._variables[media_type]
+
+    def providers(self, media_type: MediaType) -> frozenset[Provider]:
+        return self._providers[media_type]
+
+    def needs(self, provider: Provider) -> bool:
+        return any(provider in providers for providers in self._providers.values())
+
+    def render(self, media_type: MediaType, bindings: Mapping[str, Any]) -> list[str]:
+        return [
+            sanitize(template.render(bindings))
+            for template in self.templates(media_type)
+        ]
+
+    def render_path(
+        self,
+        media_type: MediaType,
+        bindings: Mapping[str, Any],
+        base_dir: Path,
+        suffix: str,
+    ) -> Path:
+        return to_path(self.render(media_type, bindings), base_dir, suffix)
+
+
+def to_path(segments: list[str], base_dir: Path, suffix: str) -> Path:
+    new_path = base_dir.joinpath(*segments)
+    return new_path.with_name(new_path.name + suffix)
+
+
+@cache
+def get_template_engine() -> TemplateEngine:
+    service = get_config_service()
+    cache_dir = (
+        get_app_dir() / "templates" if service.model.general.template_cache else None
+    )
+    engine = TemplateEngine(cache_dir)
+    engine.load(service.model)
+    service.subscribe(lambda service: engine.load(service.model))
+    return engine
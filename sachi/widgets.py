@@ -0,0 +1,312 @@
+from itertools import accumulate, count
+from typing import Any, ClassVar, Iterable, Sequence
+
+from rich.cells import cell_len
+from rich.style import Style
+from rich.text import Text
+from textual import events
+from textual.binding import Binding, BindingType
+from textual.geometry import Region, Size
+from textual.reactive import reactive
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+CELL_PADDING = 1
+
+
+def plain(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, Text):
+        return value.plain
+    return str(value)
+
+
+def to_text(value: Any) -> Text:
+    # cells are shared with the row store, so never style them in place
+    if isinstance(value, Text):
+        return value.copy()
+    return Text(plain(value))
+
+
+# rows live in a plain store and are shown through a list of keys, so only
+# the lines in view are ever rendered and sorting only reorders that list
+class VirtualTable(ScrollView, can_focus=True):
+    BINDINGS: ClassVar[list[BindingType]] = [
+        Binding("up", "cursor_up", "Cursor up", show=False),
+        Binding("down", "cursor_down", "Cursor down", show=False),
+        Binding("right", "cursor_right", "Cursor right", show=False),
+        Binding("left", "cursor_left", "Cursor left", show=False),
+        Binding("pageup", "page_up", "Page up", show=False),
+        Binding("pagedown", "page_down", "Page down", show=False),
+        Binding("ctrl+home", "scroll_top", "Top", show=False),
+        Binding("ctrl+end", "scroll_bottom", "Bottom", show=False),
+        Binding("home", "scroll_home", "Home", show=False),
+        Binding("end", "scroll_end", "End", show=False),
+    ]
+
+    COMPONENT_CLASSES: ClassVar[set[str]] = {
+        "virtual-table--cursor",
+        "virtual-table--header",
+        "virtual-table--even-row",
+        "virtual-table--odd-row",
+    }
+
+    DEFAULT_CSS = """
+    VirtualTable {
+        background: $surface;
+        color: $foreground;
+
+        &:focus {
+            background-tint: $foreground 5%;
+            & > .virtual-table--cursor {
+                background: $block-cursor-background;
+                color: $block-cursor-foreground;
+                text-style: $block-cursor-text-style;
+            }
+            & > .virtual-table--header {
+                background-tint: $foreground 5%;
+            }
+        }
+
+        &:dark > .virtual-table--even-row {
+            background: $surface-darken-1 40%;
+        }
+
+        & > .virtual-table--header {
+            text-style: bold;
+            background: $panel;
+            color: $foreground;
+        }
+
+        & > .virtual-table--even-row {
+            background: $surface-lighten-1 50%;
+        }
+
+        & > .virtual-table--cursor {
+            background: $block-cursor-blurred-background;
+            color: $block-cursor-blurred-foreground;
+            text-style: $block-cursor-blurred-text-style;
+        }
+    }
+    """
+
+    cursor_row: reactive[int] = reactive(0)
+    cursor_column: reactive[int] = reactive(0)
+
+    def __init__(self, zebra_stripes: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.zebra_stripes = zebra_stripes
+        self.columns: list[str] = []
+        self._widths: list[int] = []
+        self._rows: dict[int, list[Any]] = {}
+        self._order: list[int] = []
+        self._keys = count()
+        self._styles: dict[str, Style] = {}
+        self._pending: dict[tuple[int, int], tuple[Any, bool]] = {}
+        self._flush_pending = False
+
+    @property
+    def row_count(self) -> int:
+        return len(self._order)
+
+    @property
+    def ordered_keys(self) -> Sequence[int]:
+        return self._order
+
+    @property
+    def cursor_key(self) -> int | None:
+        if 0 <= self.cursor_row < len(self._order):
+            return self._order[self.cursor_row]
+        return None
+
+    @property
+    def page_height(self) -> int:
+        # the header takes the first line
+        return max(0, self.size.height - 1)
+
+    def visible_keys(self) -> Sequence[int]:
+        start = round(self.scroll_y)
+        return self._order[start : start + self.page_height]
+
+    def add_columns(self, *labels: str) -> tuple[int, ...]:
+        start = len(self.columns)
+        self.columns.extend(labels)
+        self._widths.extend(cell_len(label) for label in labels)
+        self._update_virtual_size()
+        return tuple(range(start, len(self.columns)))
+
+    def add_rows(self, rows: Iterable[Sequence[Any]]) -> list[int]:
+        keys = []
+        for cells in rows:
+            key = next(self._keys)
+            self._rows[key] = list(cells)
+            self._order.append(key)
+            for column, value in enumerate(cells):
+                self._measure(column, value)
+            keys.append(key)
+        self._update_virtual_size()
+        self.refresh()
+        return keys
+
+    def add_row(self, *cells: Any) -> int:
+        return self.add_rows([cells])[0]
+
+    def update_cell(self, key: int, column: int, value: Any, update_width=False):
+        # updates within a frame are coalesced and applied in one flush
+        self._pending[(key, column)] = (value, update_width)
+        if not self._flush_pending:
+            self._flush_pending = True
+            self.call_after_refresh(self.flush_updates)
+
+    def flush_updates(self):
+        self._flush_pending = False
+        pending, self._pending = self._pending, {}
+        resized = False
+        for (key, column), (value, update_width) in pending.items():
+            row = self._rows.get(key)
+            if row is None:
+                # the row went away while an update for it was in flight
+                continue
+            row[column] = value
+            if update_width:
+                resized |= self._measure(column, value)
+        if resized:
+            self._update_virtual_size()
+        self.refresh()
+
+    def remove_rows(self, keys: Iterable[int]):
+        removed = {key for key in keys if self._rows.pop(key, None) is not None}
+        if not removed:
+            return
+        self._order = [key for key in self._order if key not in removed]
+        self.cursor_row = min(self.cursor_row, max(0, len(self._order) - 1))
+        self._update_virtual_size()
+        self.refresh()
+
+    def swap_rows(self, a: int, b: int):
+        self._order[a], self._order[b] = self._order[b], self._order[a]
+        self.refresh()
+
+    def sort(self, column: int):
+        rows = self._rows
+        self._order.sort(key=lambda key: plain(rows[key][column]))
+        self.refresh()
+
+    def render_lines(self, crop: Region) -> list[Strip]:
+        # styles are looked up once per paint instead of once per line
+        base_style = self.rich_style
+        self._styles = {
+            name: base_style + self.get_component_rich_style(name)
+            for name in self.COMPONENT_CLASSES
+        }
+        self._styles[""] = base_style
+        return super().render_lines(crop)
+
+    def render_line(self, y: int) -> Strip:
+        width = self.size.width
+        scroll_x, scroll_y = self.scroll_offset
+        styles = self._styles
+        position = y - 1 + scroll_y
+        if y == 0:
+            cells = self.columns
+            style = styles["virtual-table--header"]
+        elif position < len(self._order):
+            cells = self._rows[self._order[position]]
+            style = styles[""]
+            if self.zebra_stripes:
+                style = styles[
+                    "virtual-table--odd-row"
+                    if position % 2
+                    else "virtual-table--even-row"
+                ]
+        else:
+            return Strip.blank(width, styles[""])
+
+        line = Text(style=style, no_wrap=True, end="")
+        for column, (value, cell_width) in enumerate(zip(cells, self._widths)):
+            cell = to_text(value)
+            cell.truncate(cell_width, overflow="ellipsis", pad=True)
+            cell.pad(CELL_PADDING)
+            if y and position == self.cursor_row and column == self.cursor_column:
+                cell.stylize(styles["virtual-table--cursor"])
+            line.append_text(cell)
+        strip = Strip(line.render(self.app.console))
+        return strip.crop(scroll_x, scroll_x + width).adjust_cell_length(width, style)
+
+    def validate_cursor_row(self, value: int) -> int:
+        return max(0, min(value, len(self._order) - 1))
+
+    def validate_cursor_column(self, value: int) -> int:
+        return max(0, min(value, len(self.columns) - 1))
+
+    def watch_cursor_row(self):
+        if self.cursor_row < self.scroll_y:
+            self.scroll_to(y=self.cursor_row, animate=False)
+        elif self.cursor_row >= self.scroll_y + self.page_height:
+            self.scroll_to(y=self.cursor_row - self.page_height + 1, animate=False)
+
+    def watch_cursor_column(self):
+        if not self.columns:
+            return
+        offsets = [0, *accumulate(w + 2 * CELL_PADDING for w in self._widths)]
+        start, end = offsets[self.cursor_column], offsets[self.cursor_column + 1]
+        if start < self.scroll_x:
+            self.scroll_to(x=start, animate=False)
+        elif end > self.scroll_x + self.size.width:
+            self.scroll_to(x=end - self.size.width, animate=False)
+
+    def on_click(self, event: events.Click):
+        offset = event.get_content_offset(self)
+        if offset is None or offset.y == 0:
+            return
+        x = offset.x + self.scroll_x
+        self.cursor_row = offset.y - 1 + round(self.scroll_y)
+        for column, end in enumerate(
+            accumulate(w + 2 * CELL_PADDING for w in self._widths)
+        ):
+            if x < end:
+                self.cursor_column = column
+                break
+
+    def action_cursor_up(self):
+        self.cursor_row -= 1
+
+    def action_cursor_down(self):
+        self.cursor_row += 1
+
+    def action_cursor_left(self):
+        self.cursor_column -= 1
+
+    def action_cursor_right(self):
+        self.cursor_column += 1
+
+    def action_page_up(self):
+        self.cursor_row -= self.page_height
+
+    def action_page_down(self):
+        self.cursor_row += self.page_height
+
+    def action_scroll_top(self):
+        self.cursor_row = 0
+
+    def action_scroll_bottom(self):
+        self.cursor_row = len(self._order) - 1
+
+    def action_scroll_home(self):
+        self.cursor_column = 0
+
+    def action_scroll_end(self):
+        self.cursor_column = len(self.columns) - 1
+
+    def _measure(self, column: int, value: Any) -> bool:
+        width = cell_len(plain(value))
+        if width <= self._widths[column]:
+            return False
+        self._widths[column] = width
+        return True
+
+    def _update_virtual_size(self):
+        self.virtual_size = Size(
+            sum(w + 2 * CELL_PADDING for w in self._widths), len(self._order) + 1
+        )
@@ -0,0 +1,22 @@
+from importlib.resources import files
+
+import pytest
+
+import sachi.resources
+from sachi.config import get_app_dir, get_config_path, get_config_service
+from sachi.templates import get_template_engine
+
+CACHED = (get_app_dir, get_config_path, get_config_service, get_template_engine)
+
+
+@pytest.fixture(autouse=True)
+def app_dir(tmp_path, monkeypatch):
+    # every test gets its own app dir with the default config
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    for getter in CACHED:
+        getter.cache_clear()
+    content = files(sachi.resources).joinpath("config.toml").read_bytes()
+    get_config_path().write_bytes(content)
+    yield get_app_dir()
+    for getter in CACHED:
+        getter.cache_clear()
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from sachi import renamer
+from sachi.cli import cli_app
+from sachi.journal import RecordKind, RenameJournal, latest_journal
+from sachi.renamer import RenameExecutor, RenameOp
+
+
+def make_files(directory: Path, count: int) -> list[Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = [directory / f"{i}.mkv" for i in range(count)]
+    for path in paths:
+        path.write_text(path.name)
+    return paths
+
+
+def run(journal: RenameJournal, ops: list[RenameOp], kind: RecordKind = "done"):
+    return asyncio.run(RenameExecutor(ops, 2, journal=journal, journal_kind=kind).run())
+
+
+def test_plan_and_record(tmp_path):
+    sources = make_files(tmp_path / "in", 3)
+    moves = [(src, tmp_path / "out" / "nested" / src.name) for src in sources]
+    journal = RenameJournal.create()
+    ids = journal.plan(moves)
+    ops = [RenameOp(src, dst, journal_id=i) for (src, dst), i in zip(moves, ids)]
+    progress = run(journal, ops)
+    journal.finish()
+    journal.close()
+
+    assert (progress.done, progress.failed) == (3, 0)
+    state = RenameJournal.load(journal.path)
+    assert state.finished
+    assert state.planned == {
+        i: (src.absolute(), dst.absolute()) for (src, dst), i in zip(moves, ids)
+    }
+    assert state.done == set(ids)
+    assert sorted(state.applied()) == ids
+    assert state.pending() == []
+    assert set(state.dirs) == {tmp_path / "out", tmp_path / "out" / "nested"}
+
+
+def test_undo(tmp_path):
+    sources = make_files(tmp_path / "in", 2)
+    out = tmp_path / "out" / "nested"
+    moves = [(src, out / src.name) for src in sources]
+    journal = RenameJournal.create()
+    ids = journal.plan(moves)
+    run(journal, [RenameOp(*move, journal_id=i) for move, i in zip(moves, ids)])
+    journal.finish()
+    journal.close()
+
+    result = CliRunner().invoke(cli_app, ["undo", str(journal.path)])
+    assert result.exit_code == 0, result.output
+
+    assert all(src.exists() for src in sources)
+    # the directories the run created are gone again
+    assert not (tmp_path / "out").exists()
+    state = RenameJournal.load(journal.path)
+    assert state.undone == set(ids)
+    assert state.applied() == []
+    assert state.pending() == []
+
+
+def test_cancel_reports_running_moves(tmp_path, monkeypatch):
+    move = renamer.move
+
+    def slow_move(src, dst, cancelled=None):
+        time.sleep(0.01)
+        return move(src, dst, cancelled)
+
+    monkeypatch.setattr(renamer, "move", slow_move)
+    sources = make_files(tmp_path / "in", 40)
+    moves = [(src, tmp_path / "out" / src.name) for src in sources]
+    journal = RenameJournal.create()
+    ids = journal.plan(moves)
+    ops = [RenameOp(*move, journal_id=i) for move, i in zip(moves, ids)]
+    reported = []
+    executor = RenameExecutor(
+        ops, 4, lambda op, error: reported.append(op.journal_id), journal
+    )
+
+    async def cancel_midway():
+        task = asyncio.create_task(executor.run())
+        await asyncio.sleep(0.03)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cancel_midway())
+    journal.close()
+
+    moved = {i for (src, dst), i in zip(moves, ids) if dst.exists()}
+    assert 0 < len(moved) < 40
+    assert set(reported) == moved
+    assert executor.progress.done == len(moved)
+    state = RenameJournal.load(journal.path)
+    assert state.done == moved
+    assert not state.finished
+
+
+def test_nothing_moved_leaves_no_journal():
+    journal = RenameJournal.create()
+    journal.plan([])
+    journal.finish()
+    journal.close()
+    assert not journal.path.exists()
+    assert latest_journal() is None
+
+
+def test_crash_and_resume(tmp_path):
+    sources = make_files(tmp_path / "in", 4)
+    out = tmp_path / "out"
+    out.mkdir()
+    moves = [(src, out / src.name) for src in sources]
+    journal = RenameJournal.create()
+    ids = journal.plan(moves)
+    # one move is recorded, one lands on disk without its record, two never start
+    sources[0].rename(moves[0][1])
+    journal.record("done", ids[0])
+    sources[1].rename(moves[1][1])
+
+    state = RenameJournal.load(journal.path)
+    assert not state.finished
+    assert state.applied() == ids[:2]
+    assert state.pending() == ids[2:]
+
+    journal = RenameJournal(state.path)
+    pending = [RenameOp(*state.planned[i], journal_id=i) for i in state.pending()]
+    run(journal, pending)
+    journal.finish()
+    journal.close()
+
+    state = RenameJournal.load(journal.path)
+    assert state.finished
+    assert state.pending() == []
+    assert sorted(p.name for p in out.iterdir()) == [src.name for src in sources]
+
+
+def test_torn_record_is_ignored(tmp_path):
+    journal = RenameJournal.create()
+    journal.plan([(tmp_path / "a", tmp_path / "b")])
+    journal.close()
+    with journal.path.open("a") as f:
+        f.write('{"kind": "do')
+
+    state = RenameJournal.load(journal.path)
+    assert list(state.planned) == [0]
+    assert not state.finished
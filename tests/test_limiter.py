@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from sachi.sources.limiter import MIN_RATE, RateLimiter, retry_after
+
+
+def response_error(status: int, **headers: str) -> aiohttp.ClientResponseError:
+    return aiohttp.ClientResponseError(
+        None,  # type: ignore[arg-type]
+        (),
+        status=status,
+        headers=headers,  # type: ignore[arg-type]
+    )
+
+
+def run(limiter: RateLimiter, *outcomes: Exception | None) -> list[Exception | None]:
+    # the limiter's condition belongs to one loop, so every request shares it
+    async def request(error: Exception | None):
+        async with limiter.request():
+            if error is not None:
+                raise error
+
+    async def requests():
+        raised = []
+        for error in outcomes:
+            # pacing is not under test, so never wait for a token
+            limiter.tokens = 1
+            try:
+                await request(error)
+            except Exception as e:
+                raised.append(e)
+            else:
+                raised.append(None)
+        return raised
+
+    return asyncio.run(requests())
+
+
+def test_throttling_halves_rate_and_concurrency():
+    limiter = RateLimiter(rate=8, concurrency=8)
+    error = response_error(429, **{"Retry-After": "30"})
+    assert run(limiter, error) == [error]
+    assert (limiter.rate, limiter.concurrency) == (4, 4)
+    assert (limiter.throttled, limiter.errors) == (1, 0)
+    assert limiter.blocked_until > time.monotonic() + 20
+    assert limiter.in_flight == 0
+
+
+def test_errors_back_off_without_counting_as_throttled():
+    limiter = RateLimiter(rate=8, concurrency=8)
+    run(limiter, response_error(500), aiohttp.ClientConnectionError())
+    assert (limiter.rate, limiter.concurrency) == (2, 2)
+    assert (limiter.throttled, limiter.errors) == (0, 2)
+    assert limiter.blocked_until == 0
+
+
+def test_client_errors_do_not_back_off():
+    limiter = RateLimiter(rate=8, concurrency=8)
+    run(limiter, response_error(404))
+    assert limiter.rate > 8
+    assert (limiter.throttled, limiter.errors) == (0, 0)
+
+
+def test_backoff_is_bounded():
+    limiter = RateLimiter(rate=4, concurrency=4)
+    run(limiter, *(response_error(503) for _ in range(4)))
+    assert (limiter.rate, limiter.concurrency) == (MIN_RATE, 1)
+
+
+def test_additive_increase_up_to_the_maximum():
+    limiter = RateLimiter(rate=4, max_rate=5, concurrency=2, max_concurrency=3)
+    run(limiter, *(None for _ in range(10)))
+    assert (limiter.rate, limiter.concurrency) == (5, 3)
+
+
+def test_slow_responses_reduce_concurrency():
+    limiter = RateLimiter(concurrency=8, latency_target=0)
+    rate = limiter.rate
+    run(limiter, None)
+    assert limiter.concurrency == pytest.approx(7.2)
+    assert limiter.rate == rate
+
+
+def test_concurrency_limit():
+    limiter = RateLimiter(rate=50, concurrency=2, max_concurrency=2)
+    peak = 0
+
+    async def slow():
+        nonlocal peak
+        async with limiter.request():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.05)
+
+    async def requests():
+        await asyncio.gather(*(slow() for _ in range(6)))
+
+    asyncio.run(requests())
+    assert peak == 2
+
+
+def test_retry_after():
+    assert retry_after({"Retry-After": "12"}) == 12
+    assert retry_after({"Retry-After": "soon"}) is None
+    assert retry_after({}) is None
+    assert retry_after(None) is None
+    assert retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
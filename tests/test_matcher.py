@@ -0,0 +1,82 @@
+import asyncio
+from pathlib import Path
+
+from sachi.matcher import EpisodeIndex, auto_match, normalize
+from sachi.models import SachiFile
+from sachi.sources.base import MediaType, SachiEpisodeModel, SachiParentModel
+
+EPISODES = [
+    SachiEpisodeModel(1, 1, 1, "Pilot"),
+    SachiEpisodeModel(2, 1, 2, "The Job"),
+    SachiEpisodeModel(3, 1, 3, "Finale"),
+    SachiEpisodeModel(4, 2, 1, "Return"),
+    SachiEpisodeModel(5, 2, 2, "Second Wind"),
+    SachiEpisodeModel(6, 0, 1, "Behind the Scenes"),
+    SachiEpisodeModel(7, 0, 2, "Christmas Special"),
+]
+
+
+def ids(episodes: list[SachiEpisodeModel]) -> list[int]:
+    return [ep.ref_id for ep in episodes]
+
+
+def test_season_and_episode():
+    index = EpisodeIndex(EPISODES)
+    assert ids(index.find({"season": 2, "episode": 1})) == [4]
+    assert ids(index.find({"season": 1, "episode": [2, 3]})) == [2, 3]
+    assert index.find({"season": 3, "episode": 1}) == []
+
+
+def test_without_season_falls_back_to_absolute_numbers():
+    index = EpisodeIndex(EPISODES)
+    assert ids(index.find({"episode": 2})) == [2]
+    # past the end of season 1, regular episodes are counted across seasons
+    assert ids(index.find({"episode": 5})) == [5]
+    assert index.find({"episode": 6}) == []
+
+
+def test_specials():
+    index = EpisodeIndex(EPISODES)
+    assert ids(index.find({"episode_details": "Special", "episode": 2})) == [7]
+    assert ids(
+        index.find({"episode_details": "Extras", "episode_title": "Bonus 1"})
+    ) == [6]
+
+
+def test_episode_title():
+    index = EpisodeIndex(EPISODES)
+    assert ids(index.find({"episode_title": "behind the scenes"})) == [6]
+    assert ids(index.find({"season": 2, "episode_title": "Second-Wind"})) == [5]
+    assert ids(index.find({"season": 1, "alternative_title": ["Nope", "The Job"]})) == [
+        2
+    ]
+    assert index.find({"episode_title": "Unknown"}) == []
+
+
+def test_normalize():
+    assert normalize("The Show: Part 2!") == "theshowpart2"
+
+
+def test_auto_match():
+    parent = SachiParentModel(MediaType.SERIES, 1, "The Show", 2020)
+    guesses = {
+        "the.show.s01e02.mkv": {"title": "The Show", "season": 1, "episode": 2},
+        "show.s02e01.mkv": {"title": "Show", "season": 2, "episode": 1},
+        "other.s01e01.mkv": {"title": "Other", "season": 1, "episode": 1},
+        "the.show.s09e01.mkv": {"title": "The Show", "season": 9, "episode": 1},
+    }
+
+    async def run() -> list[SachiFile]:
+        files = []
+        for name, guess in guesses.items():
+            file = SachiFile(Path(name), Path(), lambda _: None)
+            file.apply_guess(guess)
+            files.append(file)
+        return auto_match(files, parent, EPISODES, ["Show"])
+
+    matched = asyncio.run(run())
+    assert [file.path.name for file in matched] == [
+        "the.show.s01e02.mkv",
+        "show.s02e01.mkv",
+    ]
+    assert [file.match.episode.ref_id for file in matched if file.match] == [2, 4]
@@ -0,0 +1,162 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from sachi import planner
+from sachi.config import get_config_path, get_config_service
+from sachi.journal import RenameJournal
+from sachi.models import SachiFile, SachiMatch
+from sachi.planner import (
+    PlannedRename,
+    PlanRecord,
+    apply_plan,
+    plan_renames,
+    read_plan,
+    write_plan_record,
+)
+from sachi.renamer import RenameOp
+from sachi.sources.base import MediaType, SachiEpisodeModel, SachiParentModel
+
+PARENT = SachiParentModel(MediaType.SERIES, 1, "Show", 2020)
+
+
+def destination(base_dir: Path, number: int) -> Path:
+    return (
+        base_dir
+        / "TV Shows"
+        / "Show"
+        / "Season 01"
+        / f"Show - S01E{number:02} - Pilot.mkv"
+    )
+
+
+def plan(base_dir: Path, files: dict[str, int]) -> dict[str, PlannedRename]:
+    async def run() -> list[PlannedRename]:
+        items = []
+        for name, number in files.items():
+            file = SachiFile(base_dir / name, base_dir, lambda _: None)
+            file.match = SachiMatch(
+                PARENT, SachiEpisodeModel(number, 1, number, "Pilot")
+            )
+            items.append((file, file.render_new_path()))
+        return plan_renames(items)
+
+    return {
+        str(planned.file.path.relative_to(base_dir)): planned
+        for planned in asyncio.run(run())
+    }
+
+
+def test_distinct_destinations(tmp_path):
+    planned = plan(tmp_path, {"a.mkv": 1, "b.mkv": 2})
+    assert planned["a.mkv"].dst == destination(tmp_path, 1)
+    assert planned["b.mkv"].dst == destination(tmp_path, 2)
+    for p in planned.values():
+        assert p.collision is None
+        assert (p.file.ctx.di, p.file.ctx.dc) == (1, 1)
+
+
+def test_same_destination_keeps_the_first_by_path(tmp_path):
+    planned = plan(tmp_path, {"b.mkv": 1, "a.mkv": 1})
+    assert planned["a.mkv"].collision is None
+    assert planned["b.mkv"].collision == "Same destination as a.mkv"
+    assert (planned["a.mkv"].file.ctx.di, planned["a.mkv"].file.ctx.dc) == (1, 2)
+    assert (planned["b.mkv"].file.ctx.di, planned["b.mkv"].file.ctx.dc) == (2, 2)
+
+
+def test_file_already_at_its_destination_keeps_it(tmp_path):
+    dst = destination(tmp_path, 1)
+    dst.parent.mkdir(parents=True)
+    dst.touch()
+    name = str(dst.relative_to(tmp_path))
+    planned = plan(tmp_path, {"a.mkv": 1, name: 1})
+    assert planned[name].collision is None
+    assert planned["a.mkv"].collision == f"Same destination as {dst.name}"
+
+
+def test_destination_already_exists(tmp_path):
+    dst = destination(tmp_path, 1)
+    dst.parent.mkdir(parents=True)
+    dst.touch()
+    planned = plan(tmp_path, {"a.mkv": 1})
+    assert planned["a.mkv"].collision == "Destination already exists"
+
+
+def test_destination_being_renamed(tmp_path):
+    dst = destination(tmp_path, 1)
+    dst.parent.mkdir(parents=True)
+    dst.touch()
+    # the file at episode 1's destination is really episode 2
+    name = str(dst.relative_to(tmp_path))
+    planned = plan(tmp_path, {"a.mkv": 1, name: 2})
+    assert planned["a.mkv"].collision == "Destination being renamed"
+    assert planned[name].collision is None
+
+
+def test_duplicate_index_renders_distinct_destinations(tmp_path):
+    config_path = get_config_path()
+    config_path.write_text(
+        config_path.read_text().replace(
+            '"{{n}} - {{s00e00}} - {{t}}"', '"{{n}} - {{s00e00}} - {{t}} ({{di}})"'
+        )
+    )
+    get_config_service().check()
+    planned = plan(tmp_path, {"b.mkv": 1, "a.mkv": 1})
+    assert planned["a.mkv"].dst.name == "Show - S01E01 - Pilot (1).mkv"
+    assert planned["b.mkv"].dst.name == "Show - S01E01 - Pilot (2).mkv"
+    for p in planned.values():
+        assert p.collision is None
+
+
+def test_plan_round_trip(tmp_path):
+    async def run() -> PlanRecord:
+        file = SachiFile(tmp_path / "a.mkv", tmp_path, lambda _: None)
+        file.match = SachiMatch(PARENT, SachiEpisodeModel(1, 1, 1, "Pilot"))
+        file.ctx.crc32 = "DEADBEEF"
+        return PlanRecord.from_file(file, file.render_new_path(), "Fake")
+
+    record = asyncio.run(run())
+    plan_path = tmp_path / "plan.jsonl"
+    with plan_path.open("wb") as f:
+        write_plan_record(f, record)
+        write_plan_record(f, record)
+
+    records = list(read_plan(plan_path))
+    assert records == [record, record]
+    assert records[0].dst == destination(tmp_path, 1)
+    assert records[0].service == "Fake"
+    assert records[0].parent == PARENT
+    assert records[0].context["n"] == "Show"
+
+
+@pytest.mark.parametrize("batch_size", [100, 1])
+def test_apply_plan_rejects_duplicate_destinations(tmp_path, monkeypatch, batch_size):
+    # within a batch the plan is checked, across batches the executor refuses
+    monkeypatch.setattr(planner, "APPLY_BATCH", batch_size)
+    for name in ("a.mkv", "b.mkv", "c.mkv"):
+        (tmp_path / name).write_text(name)
+
+    def record(src: str, dst: str) -> PlanRecord:
+        return PlanRecord(tmp_path / src, tmp_path / dst, "Fake", PARENT, [], {})
+
+    records = [
+        record("a.mkv", "out/1.mkv"),
+        record("b.mkv", "out/1.mkv"),
+        record("c.mkv", "c.mkv"),
+    ]
+    failed: list[RenameOp] = []
+
+    def on_done(op: RenameOp, error: Exception | None):
+        if error is not None:
+            failed.append(op)
+
+    journal = RenameJournal.create()
+    progress = asyncio.run(apply_plan(records, journal, on_done=on_done))
+    journal.close()
+
+    assert (progress.total, progress.done, progress.failed) == (2, 1, 1)
+    assert [op.src.name for op in failed] == ["b.mkv"]
+    assert (tmp_path / "out" / "1.mkv").read_text() == "a.mkv"
+    assert (tmp_path / "b.mkv").exists()
+    assert (tmp_path / "c.mkv").exists()
@@ -0,0 +1,29 @@
+from sachi.resolver import TitleCache
+from sachi.sources.base import MediaType, SachiParentModel
+
+OFFICE_US = SachiParentModel(MediaType.SERIES, 73244, "The Office (US)", 2005)
+
+
+def test_exact_title_and_year(tmp_path):
+    cache = TitleCache(tmp_path / "titles.sqlite")
+    cache.confirm("tvdb", "The Office US", 2005, OFFICE_US)
+
+    resolution = cache.resolve("tvdb", "the office: US", 2005)
+    assert resolution is not None
+    assert resolution.exact
+    assert resolution.parent == OFFICE_US
+
+
+def test_similar_titles_are_not_exact(tmp_path):
+    cache = TitleCache(tmp_path / "titles.sqlite")
+    cache.confirm("tvdb", "The Office US", 2005, OFFICE_US)
+
+    resolution = cache.resolve("tvdb", "The Office UK", 2005)
+    assert resolution is not None
+    assert not resolution.exact
+    assert resolution.confidence < 1
+    # the same title from another year is another series as well
+    for year in (2001, None):
+        resolution = cache.resolve("tvdb", "The Office US", year)
+        assert resolution is not None
+        assert not resolution.exact
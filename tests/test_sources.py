@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from sachi.sources.base import (
+    MediaType,
+    SachiEpisodeModel,
+    SachiParentModel,
+    SachiSource,
+)
+
+
+class FakeSource(SachiSource[int], media_type=MediaType.SERIES, service="Fake"):
+    def __init__(self):
+        self.searches: list[str] = []
+        self.release = asyncio.Event()
+        self.error: Exception | None = None
+
+    async def search(self, query: str) -> list[SachiParentModel[int]]:
+        self.searches.append(query)
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return [SachiParentModel(MediaType.SERIES, len(self.searches), query)]
+
+    async def get_episodes(
+        self, parent: SachiParentModel[int]
+    ) -> list[SachiEpisodeModel[int]]:
+        return []
+
+
+@pytest.fixture(autouse=True)
+def coalesce_stats():
+    FakeSource.coalesce_stats.calls = FakeSource.coalesce_stats.coalesced = 0
+
+
+def test_concurrent_calls_share_one_request():
+    async def run():
+        source = FakeSource()
+        calls = [asyncio.create_task(source.search(q)) for q in ("a", "a", "b", "a")]
+        await asyncio.sleep(0)
+        source.release.set()
+        return source, await asyncio.gather(*calls)
+
+    source, results = asyncio.run(run())
+    assert source.searches == ["a", "b"]
+    assert results[0] == results[1] == results[3]
+    assert results[0] is not results[1]
+    assert results[2][0].title == "b"
+    stats = FakeSource.coalesce_stats
+    assert (stats.calls, stats.coalesced) == (4, 2)
+
+
+def test_finished_calls_are_not_reused():
+    async def run():
+        source = FakeSource()
+        source.release.set()
+        await source.search("a")
+        await source.search("a")
+        return source
+
+    assert asyncio.run(run()).searches == ["a", "a"]
+
+
+def test_errors_reach_every_caller():
+    async def run():
+        source = FakeSource()
+        source.error = RuntimeError("down")
+        calls = [asyncio.create_task(source.search("a")) for _ in range(3)]
+        await asyncio.sleep(0)
+        source.release.set()
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    assert [str(e) for e in asyncio.run(run())] == ["down"] * 3
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def run():
+        source = FakeSource()
+        first = asyncio.create_task(source.search("a"))
+        second = asyncio.create_task(source.search("a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        source.release.set()
+        return first, await second
+
+    first, result = asyncio.run(run())
+    assert first.cancelled()
+    assert result[0].title == "a"
@@ -0,0 +1,135 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from rich.text import Text
+from textual.app import App, ComposeResult
+from textual.pilot import Pilot
+
+from sachi.widgets import VirtualTable
+
+
+class TableApp(App):
+    def compose(self) -> ComposeResult:
+        yield VirtualTable()
+
+
+def run(test: Callable[[Pilot, VirtualTable], Awaitable[None]]):
+    async def main():
+        app = TableApp()
+        async with app.run_test(size=(40, 6)) as pilot:
+            table = app.query_one(VirtualTable)
+            table.add_columns("From", "To")
+            await test(pilot, table)
+
+    asyncio.run(main())
+
+
+def lines(table: VirtualTable) -> list[str]:
+    # the header and then the rows in view, as they are painted
+    table.render_lines(table.region.reset_offset)
+    return [table.render_line(y).text.rstrip() for y in range(table.size.height)]
+
+
+def test_add_rows():
+    async def test(pilot: Pilot, table: VirtualTable):
+        keys = table.add_rows([("b.mkv", None), ("a.mkv", "A")])
+        key = table.add_row("c.mkv", Text("C", style="red"))
+        await pilot.pause()
+        assert list(table.ordered_keys) == [*keys, key]
+        assert table.row_count == 3
+        assert lines(table)[:4] == [
+            " From   To",
+            " b.mkv",
+            " a.mkv  A",
+            " c.mkv  C",
+        ]
+
+    run(test)
+
+
+def test_only_rows_in_view_are_rendered():
+    async def test(pilot: Pilot, table: VirtualTable):
+        keys = table.add_rows((f"{i}.mkv", None) for i in range(100))
+        await pilot.pause()
+        assert table.virtual_size.height == 101
+        assert list(table.visible_keys()) == keys[:5]
+        table.cursor_row = 50
+        await pilot.pause()
+        assert list(table.visible_keys()) == keys[46:51]
+        assert lines(table)[-1] == " 50.mkv"
+
+    run(test)
+
+
+def test_sort_swap_and_remove():
+    async def test(pilot: Pilot, table: VirtualTable):
+        b, c, a = table.add_rows([("b", 2), ("c", 1), ("a", 3)])
+        table.sort(0)
+        assert list(table.ordered_keys) == [a, b, c]
+        table.sort(1)
+        assert list(table.ordered_keys) == [c, b, a]
+        table.swap_rows(0, 2)
+        assert list(table.ordered_keys) == [a, b, c]
+
+        table.cursor_row = 2
+        table.remove_rows([c, 1234])
+        assert list(table.ordered_keys) == [a, b]
+        assert table.cursor_row == 1
+        assert table.cursor_key == b
+        assert table.virtual_size.height == 3
+        await pilot.pause()
+        assert lines(table)[1:4] == [" a     3", " b     2", ""]
+
+    run(test)
+
+
+def test_cell_updates_are_flushed_once_per_frame():
+    async def test(pilot: Pilot, table: VirtualTable):
+        a, b = table.add_rows([("a", None), ("b", None)])
+        await pilot.pause()
+        flushes = 0
+        flush = table.flush_updates
+
+        def counted():
+            nonlocal flushes
+            flushes += 1
+            flush()
+
+        table.flush_updates = counted
+        for i in range(10):
+            table.update_cell(a, 1, f"a{i}")
+        table.update_cell(b, 1, "b")
+        # nothing is applied until the next refresh
+        assert lines(table)[1:3] == [" a", " b"]
+        await pilot.pause()
+        assert flushes == 1
+        assert lines(table)[1:3] == [" a     a9", " b     b"]
+
+    run(test)
+
+
+def test_updates_for_removed_rows_are_dropped():
+    async def test(pilot: Pilot, table: VirtualTable):
+        a, b = table.add_rows([("a", None), ("b", None)])
+        table.update_cell(a, 1, "gone")
+        table.update_cell(b, 1, "ok")
+        table.remove_rows([a])
+        await pilot.pause()
+        assert lines(table)[1:3] == [" b     ok", ""]
+
+    run(test)
+
+
+def test_update_width():
+    async def test(pilot: Pilot, table: VirtualTable):
+        (a,) = table.add_rows([("a", None)])
+        width = table.virtual_size.width
+        table.update_cell(a, 1, "longer")
+        await pilot.pause()
+        assert table.virtual_size.width == width
+        table.update_cell(a, 1, "much longer", update_width=True)
+        await pilot.pause()
+        assert table.virtual_size.width == width + len("much longer") - len("To")
+        assert lines(table)[1] == " a     much longer"
+
+    run(test)
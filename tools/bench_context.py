@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import tracemalloc
+from dataclasses import fields, make_dataclass
+
+from sachi.context import FileBotContext
+
+# Same fields as FileBotContext, laid out like the previous generator output
+# (a plain @dataclass whose __init__ assigns every attribute).
+DenseFileBotContext = make_dataclass(
+    "DenseFileBotContext",
+    [(f.name, f.type, None) for f in fields(FileBotContext)],
+)
+
+
+def fill(ctx):
+    # what a matched episode with guessit output typically sets
+    ctx.n = "Firefly"
+    ctx.y = 2002
+    ctx.s = 1
+    ctx.s00e00 = "S01E01"
+    ctx.t = "Serenity"
+    ctx.source = "Blu-ray"
+
+
+def bytes_per_instance(cls, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    instances = [cls() for _ in range(count)]
+    for ctx in instances:
+        fill(ctx)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    gc.collect()
+    return current / count
+
+
+parser = argparse.ArgumentParser(description="FileBotContext memory benchmark")
+parser.add_argument("counts", nargs="*", type=int, default=[10_000, 100_000, 1_000_000])
+args = parser.parse_args()
+
+print(f"{'instances':>10} {'dense B/file':>14} {'sparse B/file':>14} {'ratio':>7}")
+for count in args.counts:
+    dense = bytes_per_instance(DenseFileBotContext, count)
+    sparse = bytes_per_instance(FileBotContext, count)
+    print(f"{count:>10} {dense:>14.0f} {sparse:>14.0f} {dense / sparse:>6.1f}x")
@@ -47,8 +47,10 @@ from pathlib import Path
 from typing import Any
 
 
-@dataclass
+@dataclass(init=False)
 class FileBotContext:
+    # No generated __init__: unset fields resolve to the class-level None
+    # defaults, so each instance only stores the handful of values it sets.
     {%- for field in fields %}
     {{field.Name}}: {{field.Type}} | None = None
     """{{field.Description}} (`{{field.Example}}`)"""